@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+
+# Pre-aggregated views of df_airline.
+#
+# The cube holds one row per (Year, quarter, carrier) with the sum and the non-null
+# count of every measure. Means are recovered exactly as sum / count, so any
+# roll-up to (Year) or (Year, carrier), with or without a carrier filter, is a
+# groupby over the cube instead of over the raw rows.
+
+CUBE_KEYS = ['Year', 'quarter', 'carrier_full']
+CUBE_MEASURES = ['fare', 'passengers', 'large_ms']
+
+
+def build_cube(df):
+    # Sum in float64 so partial cubes (chunks, refresh deltas) add up to the same totals
+    measures = {measure: df[measure].astype('float64') for measure in CUBE_MEASURES}
+    grouped = df[CUBE_KEYS].assign(**measures).groupby(CUBE_KEYS, observed=True, dropna=False)[CUBE_MEASURES]
+    sums = grouped.sum()
+    counts = grouped.count()
+
+    cube = pd.DataFrame(index=sums.index)
+    for measure in CUBE_MEASURES:
+        cube[f'{measure}_sum'] = sums[measure].astype('float64')
+        cube[f'{measure}_count'] = counts[measure].astype('int64')
+    return cube.reset_index()
+
+
+# Fold the cube of newly arrived rows into an existing cube. Sums and counts add, so the
+# result is exactly build_cube() over the old and new rows together.
+def merge_cubes(cube, delta_cube):
+    merged = pd.concat([cube, delta_cube], ignore_index=True)
+    merged['carrier_full'] = merged['carrier_full'].astype(object)
+    columns = [column for column in merged.columns if column not in CUBE_KEYS]
+    merged = merged.groupby(CUBE_KEYS, dropna=False)[columns].sum().reset_index()
+    merged['carrier_full'] = merged['carrier_full'].astype('category')
+    return merged
+
+
+# Roll the cube up to `by`, e.g. rollup(cube, ['Year'], {'fare': 'mean', 'passengers': 'sum'}),
+# mirroring DataFrame.groupby(by).agg(...) on the raw rows for 'mean' and 'sum'
+def rollup(cube, by, agg, carriers=None):
+    if carriers:
+        cube = cube[cube['carrier_full'].isin(carriers)]
+
+    columns = [f'{measure}_{part}' for measure in agg for part in ('sum', 'count')]
+    grouped = cube.groupby(by, observed=True)[columns].sum()
+
+    result = pd.DataFrame(index=grouped.index)
+    for measure, how in agg.items():
+        if how == 'mean':
+            result[measure] = grouped[f'{measure}_sum'] / grouped[f'{measure}_count']
+        elif how == 'sum':
+            result[measure] = grouped[f'{measure}_sum']
+        else:
+            raise ValueError(f"Unsupported aggregation for {measure}: {how}")
+    return result.reset_index()
+
+
+# Per-(Year, quarter) average fare plus its 2-quarter rolling mean within each year (tab3)
+def quarterly_fare_series(cube):
+    series = rollup(cube, ['Year', 'quarter'], {'fare': 'mean'})
+    series['rolling_fare'] = (
+        series.groupby('Year')['fare']
+        .rolling(window=2)
+        .mean()
+        .reset_index(level=0, drop=True)
+    )
+    return series
+
+
+# Quarterly market share of the top-n carriers (by cumulative share), pre-split by year
+# so the tab5 slider callback only ever touches one small frame (tab5)
+def quarterly_market_share_by_year(cube, n=5):
+    quarterly = rollup(cube, ['Year', 'quarter', 'carrier_full'], {'large_ms': 'mean'})
+    top_carriers = list(quarterly.groupby('carrier_full', observed=True)['large_ms'].sum().nlargest(n).index)
+    quarterly = quarterly[quarterly['carrier_full'].isin(top_carriers)]
+    by_year = {year: frame.reset_index(drop=True) for year, frame in quarterly.groupby('Year')}
+    return top_carriers, by_year
+
+
+# Integer key of a (Year, quarter) period; consecutive quarters have consecutive keys
+def period_key(year, quarter):
+    return int(year) * 4 + int(quarter) - 1
+
+
+def period_label(key):
+    return f'{key // 4} Q{key % 4 + 1}'
+
+
+class PeriodPrefixSums:
+    # Per-carrier running totals of the cube measures over (Year, quarter) periods in time
+    # order, starting from zero. The total over any contiguous range of periods is one
+    # subtraction per carrier (cum[:, stop] - cum[:, start]), so a time-range query never
+    # scans or groups the cube, let alone the raw rows.
+    COLUMNS = [f'{measure}_{part}' for measure in CUBE_MEASURES for part in ('sum', 'count')] + ['rows']
+
+    def __init__(self, cube):
+        cube = cube.dropna(subset=['Year', 'quarter', 'carrier_full'])
+        keys = cube['Year'].to_numpy('int64') * 4 + cube['quarter'].to_numpy('int64') - 1
+        self.periods = np.unique(keys)
+        self.years = self.periods // 4
+
+        carriers = cube['carrier_full']
+        if isinstance(carriers.dtype, pd.CategoricalDtype):
+            # Same carrier order as a groupby over the cube
+            observed = set(carriers.cat.codes.unique())
+            self.carriers = [c for code, c in enumerate(carriers.cat.categories) if code in observed]
+        else:
+            self.carriers = sorted(carriers.unique())
+        self.carrier_index = pd.Index(self.carriers)
+
+        values = cube.assign(rows=1.0)[self.COLUMNS].to_numpy('float64')
+        dense = np.zeros((len(self.carriers), len(self.periods) + 1, len(self.COLUMNS)))
+        np.add.at(dense, (self.carrier_index.get_indexer(carriers), np.searchsorted(self.periods, keys) + 1), values)
+        self.cum = np.cumsum(dense, axis=1)
+
+    # Positions [start, stop) of the periods whose key is within [first, last]
+    def positions(self, first=None, last=None):
+        start = 0 if first is None else int(np.searchsorted(self.periods, first, side='left'))
+        stop = len(self.periods) if last is None else int(np.searchsorted(self.periods, last, side='right'))
+        return start, max(start, stop)
+
+    # Same frame as rollup(cube, by, agg, carriers) over the periods within [first, last];
+    # `by` is ['Year'] or ['Year', 'carrier_full']. Each (year, carrier) cell is one subtraction.
+    def rollup(self, by, agg, carriers=None, first=None, last=None):
+        start, stop = self.positions(first, last)
+        if carriers:
+            rows = np.unique(self.carrier_index.get_indexer(carriers))
+            rows = rows[rows >= 0]
+        else:
+            rows = np.arange(len(self.carriers))
+
+        # Year boundaries inside the range; edge years only count their selected quarters
+        years = self.years[start:stop]
+        edges = np.concatenate([[start], start + np.flatnonzero(np.diff(years)) + 1, [stop]]) if stop > start else np.array([start])
+        cum = self.cum[rows][:, edges]
+        totals = cum[:, 1:] - cum[:, :-1]  # (carrier, year, column)
+        year_values = years[edges[:-1] - start] if stop > start else years[:0]
+
+        if by == ['Year']:
+            totals = totals.sum(axis=0)
+            result = pd.DataFrame({'Year': year_values})
+        elif by == ['Year', 'carrier_full']:
+            totals = totals.transpose(1, 0, 2).reshape(-1, len(self.COLUMNS))
+            carrier_codes = np.tile(np.arange(len(rows)), len(year_values))
+            result = pd.DataFrame({
+                'Year': np.repeat(year_values, len(rows)),
+                'carrier_full': pd.Categorical.from_codes(carrier_codes, categories=[self.carriers[i] for i in rows]),
+            })
+        else:
+            raise ValueError(f"Unsupported grouping for a period range: {by}")
+
+        column = {name: i for i, name in enumerate(self.COLUMNS)}
+        present = totals[..., column['rows']] > 0
+        for measure, how in agg.items():
+            sums = totals[..., column[f'{measure}_sum']]
+            if how == 'mean':
+                counts = totals[..., column[f'{measure}_count']]
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    result[measure] = np.where(counts > 0, sums / counts, np.nan)
+            elif how == 'sum':
+                result[measure] = sums
+            else:
+                raise ValueError(f"Unsupported aggregation for {measure}: {how}")
+        return result[present].reset_index(drop=True)
+
+
+# Compact encoding of the prefix sums for a dcc.Store: the browser answers any period range
+# and carrier selection from it (assets/section2.js). Running totals are kept, not means, so
+# any range and selection re-aggregates exactly. Only the columns section2.js reads are sent.
+STORE_COLUMNS = ['fare_sum', 'fare_count', 'large_ms_sum', 'large_ms_count', 'rows']
+
+
+def encode_period_prefix_sums(prefix_sums, color_map, precision=4):
+    carriers = [str(carrier) for carrier in prefix_sums.carriers]
+    encoded = {
+        'periods': prefix_sums.periods.tolist(),
+        'carriers': carriers,
+        'colors': [color_map.get(carrier) for carrier in carriers],
+    }
+    for column in STORE_COLUMNS:
+        values = prefix_sums.cum[:, :, PeriodPrefixSums.COLUMNS.index(column)]
+        if column.endswith(('_count', 'rows')):
+            encoded[column] = values.astype('int64').tolist()
+        else:
+            encoded[column] = values.round(precision).tolist()
+    return encoded
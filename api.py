@@ -0,0 +1,212 @@
+import hashlib
+import io
+import json
+import urllib.parse
+
+import flask
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional; Arrow responses answer 406 without it
+    pa = None
+
+import aggregates
+
+# Read-only data API over the dashboard's aggregates, on the Dash Flask server.
+#
+#   GET /api/v1/fares/yearly     year, fare, passengers, market_share (carrier filter re-aggregates)
+#   GET /api/v1/fares/carriers   year, carrier, fare
+#   GET /api/v1/market-share     year, carrier, market_share
+#   GET /api/v1/routes           origin, destination, passengers and coordinates, busiest first
+#
+# Query parameters: carrier (repeatable or comma-separated), year_from / year_to (or year),
+# origin and min_passengers (routes only), limit / offset for pagination, and
+# format=json|arrow (or Accept: application/vnd.apache.arrow.stream).
+#
+# Year and carrier filters are answered from the per-carrier prefix sums, so no request
+# scans the cube. Results stream in batches (JSON records or Arrow IPC record batches).
+# Every response carries an ETag derived from the dataset version and the query, and a
+# matching If-None-Match gets a 304 before anything is computed.
+
+PREFIX = '/api/v1'
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 100_000
+BATCH_ROWS = 5000
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _int_arg(args, name, default=None, minimum=None):
+    value = args.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer") from None
+    if minimum is not None and value < minimum:
+        raise BadRequest(f"{name} must be >= {minimum}")
+    return value
+
+
+def _carriers(args):
+    carriers = [name.strip() for value in args.getlist('carrier') for name in value.split(',') if name.strip()]
+    return carriers or None
+
+
+# (first, last) period keys covering the requested years, or (None, None) for all of them
+def _period_range(args):
+    year = _int_arg(args, 'year')
+    year_from = _int_arg(args, 'year_from', year)
+    year_to = _int_arg(args, 'year_to', year)
+    if year_from is not None and year_to is not None and year_from > year_to:
+        raise BadRequest("year_from must not be after year_to")
+    first = aggregates.period_key(year_from, 1) if year_from is not None else None
+    last = aggregates.period_key(year_to, 4) if year_to is not None else None
+    return first, last
+
+
+def _reject(args, names, endpoint):
+    for name in names:
+        if args.get(name) not in (None, ''):
+            raise BadRequest(f"{endpoint} does not support the {name} filter")
+
+
+# ---- Endpoints: (dataset, request args) -> DataFrame ----
+
+def yearly_fares(ds, args):
+    _reject(args, ['origin', 'min_passengers'], 'fares/yearly')
+    first, last = _period_range(args)
+    frame = ds.period_sums.rollup(['Year'], {'fare': 'mean', 'passengers': 'sum', 'large_ms': 'mean'},
+                                  _carriers(args), first, last)
+    return frame.rename(columns={'Year': 'year', 'large_ms': 'market_share'})
+
+
+def carrier_fares(ds, args):
+    _reject(args, ['origin', 'min_passengers'], 'fares/carriers')
+    first, last = _period_range(args)
+    frame = ds.period_sums.rollup(['Year', 'carrier_full'], {'fare': 'mean'}, _carriers(args), first, last)
+    return frame.rename(columns={'Year': 'year', 'carrier_full': 'carrier'})
+
+
+def market_share(ds, args):
+    _reject(args, ['origin', 'min_passengers'], 'market-share')
+    first, last = _period_range(args)
+    frame = ds.period_sums.rollup(['Year', 'carrier_full'], {'large_ms': 'mean'}, _carriers(args), first, last)
+    return frame.rename(columns={'Year': 'year', 'carrier_full': 'carrier', 'large_ms': 'market_share'})
+
+
+def route_list(ds, args):
+    # Route totals cover the whole history and every carrier
+    _reject(args, ['carrier', 'year', 'year_from', 'year_to'], 'routes')
+    ranking = ds.route_ranking
+    positions = ranking.select(min_passengers=_int_arg(args, 'min_passengers', minimum=0), origin=args.get('origin') or None)
+    frame = ranking.routes.iloc[positions][['city1', 'city2', 'passengers', 'lat1', 'lon1', 'lat2', 'lon2']]
+    return frame.rename(columns={
+        'city1': 'origin', 'city2': 'destination',
+        'lat1': 'origin_lat', 'lon1': 'origin_lon', 'lat2': 'destination_lat', 'lon2': 'destination_lon',
+    })
+
+
+ENDPOINTS = {
+    'fares/yearly': yearly_fares,
+    'fares/carriers': carrier_fares,
+    'market-share': market_share,
+    'routes': route_list,
+}
+
+
+# ---- Encoding ----
+
+def _json_stream(meta, page):
+    yield json.dumps(meta)[:-1] + ', "data": ['
+    for start in range(0, len(page), BATCH_ROWS):
+        records = page.iloc[start:start + BATCH_ROWS].to_json(orient='records')[1:-1]
+        yield (',' if start else '') + records
+    yield ']}'
+
+
+def _arrow_stream(page):
+    table = pa.Table.from_pandas(page, preserve_index=False)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=BATCH_ROWS):
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+def _wants_arrow(request):
+    requested = request.args.get('format')
+    if requested:
+        if requested not in ('json', 'arrow'):
+            raise BadRequest("format must be json or arrow")
+        return requested == 'arrow'
+    best = request.accept_mimetypes.best_match(['application/json', ARROW_MIMETYPE])
+    return best == ARROW_MIMETYPE
+
+
+def _etag(version, request):
+    query = sorted((key, value) for key in request.args for value in request.args.getlist(key))
+    accept = request.headers.get('Accept', '') if 'format' not in request.args else ''
+    return hashlib.sha256(json.dumps([version, request.path, query, accept]).encode()).hexdigest()[:32]
+
+
+def _error(status, message):
+    response = flask.jsonify({'error': message})
+    response.status_code = status
+    return response
+
+
+# Register the API routes; current() returns the dataset.Dataset to serve
+def install(server, current):
+    @server.route(f'{PREFIX}/<path:endpoint>')
+    def serve_api(endpoint):
+        handler = ENDPOINTS.get(endpoint)
+        if handler is None:
+            return _error(404, f"Unknown endpoint {endpoint}; available: {', '.join(sorted(ENDPOINTS))}")
+
+        request = flask.request
+        ds = current()
+        etag = _etag(ds.version, request)
+        if etag in request.if_none_match:
+            response = flask.Response(status=304)
+            response.set_etag(etag)
+            return response
+
+        try:
+            arrow = _wants_arrow(request)
+            limit = min(_int_arg(request.args, 'limit', DEFAULT_LIMIT, minimum=1), MAX_LIMIT)
+            offset = _int_arg(request.args, 'offset', 0, minimum=0)
+            frame = handler(ds, request.args)
+        except BadRequest as error:
+            return _error(400, str(error))
+        if arrow and pa is None:
+            return _error(406, "Arrow output needs pyarrow installed")
+
+        page = frame.iloc[offset:offset + limit]
+        next_url = None
+        if offset + limit < len(frame):
+            args = request.args.to_dict(flat=False)
+            args['offset'] = [str(offset + limit)]
+            args['limit'] = [str(limit)]
+            next_url = f'{request.path}?{urllib.parse.urlencode(args, doseq=True)}'
+
+        if arrow:
+            response = flask.Response(flask.stream_with_context(_arrow_stream(page)), mimetype=ARROW_MIMETYPE)
+        else:
+            meta = {'dataset_version': ds.version, 'total': len(frame), 'offset': offset, 'limit': limit, 'next': next_url}
+            response = flask.Response(flask.stream_with_context(_json_stream(meta, page)), mimetype='application/json')
+
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        response.headers['X-Dataset-Version'] = ds.version
+        response.headers['X-Total-Count'] = str(len(frame))
+        if next_url:
+            response.headers['Link'] = f'<{next_url}>; rel="next"'
+        return response
@@ -1,146 +1,249 @@
+import logging
+import os
+
 import dash
 from dash import dcc, html
-from dash.dependencies import Input, Output
-import plotly.express as px
+from dash.dependencies import ClientsideFunction, Input, Output, State
 import plotly.graph_objects as go
-import pandas as pd
-
-# Load dataset (replace this with your dataset loading code)
-url = 'https://docs.google.com/spreadsheets/d/e/2PACX-1vSr2GZqDREbSXZ-U3GGH8ib-kC_ZKkUAuhtdSbRnuxJTcLsCl5gNvfli6SUyqHYnyF_3wa4qGLf6aeO/pub?output=csv'
-df_airline = pd.read_csv(url)
-
-# Helper function for geolocation parsing
-def parse_lat_lon(geo_str):
-    try:
-        lat, lon = geo_str.strip("()").split(",")
-        return float(lat), float(lon)
-    except (ValueError, AttributeError):
-        return None, None
-
-# Data preparation for visualizations
-yearly_data = df_airline.groupby(['Year']).agg({'fare': 'mean', 'passengers': 'sum', 'large_ms': 'mean'}).reset_index()
-airline_yearly_data = df_airline.groupby(['Year', 'carrier_full']).agg({'fare': 'mean'}).reset_index()
-market_data = df_airline.groupby(['Year', 'carrier_full']).agg({'large_ms': 'mean'}).reset_index()
-route_data = df_airline.groupby(['city1', 'city2', 'Geocoded_City1', 'Geocoded_City2'])['passengers'].sum().reset_index()
-
-route_data[['lat1', 'lon1']] = route_data['Geocoded_City1'].apply(lambda x: pd.Series(parse_lat_lon(x)))
-route_data[['lat2', 'lon2']] = route_data['Geocoded_City2'].apply(lambda x: pd.Series(parse_lat_lon(x)))
-route_data = route_data.dropna(subset=['lat1', 'lon1', 'lat2', 'lon2'])
-top_5_routes = route_data.sort_values(by='passengers', ascending=False).head(5)
+
+import aggregates
+import api
+import background
+import dataset
+import export
+import metrics
+import payload
+import refresh
+import routes
+import warmup
+from figure_cache import FigureCache, normalize_selection
+
+# The dataset comes from the local memory-mapped snapshot (build/refresh it with `python snapshot.py`).
+# Callbacks read dataset.current() once per call; it opens the snapshot on first use and every view
+# it exposes is built on first access (see dataset.py), so importing this module does no data work.
+# refresh.py may publish a newer version while the app runs.
+
+# (lat_min, lat_max, lon_min, lon_max) covered by the route map filters
+ROUTE_MAP_BOUNDS = (15, 72, -180, -60)
 
 # Initialize Dash app
-app = dash.Dash(__name__)
+app = dash.Dash(__name__, suppress_callback_exceptions=True)  # tab6 controls are created by a callback
 server = app.server
 app.title = "Airline Market Analysis"
 
-# Create a list of unique airlines
-unique_airlines = df_airline['carrier_full'].unique()
-
-# Define a colorblind-friendly palette
-color_palette = px.colors.qualitative.Safe  # Safe for colorblind users
-
-# Map each airline to a color
-global_color_map = {airline: color_palette[i % len(color_palette)] for i, airline in enumerate(unique_airlines)}
-
-# App layout
-app.layout = html.Div(
-     style={
-        'backgroundImage': 'url("https://i.pinimg.com/1200x/f5/af/38/f5af38611cd1bda1f68876a13bb6436e.jpg")',
-        'backgroundSize': 'cover',
-        'backgroundPosition': 'center',
-        'minHeight': '100vh',
-        'padding': '20px',
-    },
-    children=[
-    html.H1("Airline Market Visualization Dashboard",
-            style={
-                'textAlign': 'center',
-                'color': 'white',
-                'textShadow': '2px 2px 4px #000000',
-            }),
+# Filter Section 2 in the browser instead of on the server
+CLIENTSIDE_SECTION2 = os.environ.get('AIRLINE_CLIENTSIDE_FILTERING', '0') == '1'
 
-    # Section 1
-    html.Div([
-        html.H2("Section 1: Default Visualizations",
-                style={
-                'textAlign': 'center',
-                'color': 'white',
-                'textShadow': '2px 2px 4px #000000',
-            }),
-        dcc.Tabs(id="section1-tabs", value='tab1', children=[
-            dcc.Tab(label='Yearly Fare Trend', value='tab1'),
-            dcc.Tab(label='Average Fare by Airline', value='tab2'),
-            dcc.Tab(label='Quarterly Fare Trends', value='tab3'),
-            dcc.Tab(label='Yearly Market Share', value='tab4'),
-            dcc.Tab(label='Quarterly Market Share by Airline', value='tab5'),
-            dcc.Tab(label='Geographic Route Map', value='tab6'),
-        ]),
-        html.Div(id='section1-tabs-content'),
-    ],style={'backgroundColor': 'rgba(255, 255, 255, 0.8)', 'borderRadius': '10px', 'padding': '15px'}),
-
-    # Section 2
-    html.Div([
-        html.H2("Section 2: Filtered Visualizations",
+# Serialized callback responses, keyed by (callback, tab, airline selection) and tied to the snapshot version
+# (figures are run through payload.minimize_tree once, before they are cached)
+figure_cache = FigureCache(
+    maxsize=int(os.environ.get('AIRLINE_FIGURE_CACHE_SIZE', 256)),
+    transform=payload.minimize_tree if os.environ.get('AIRLINE_MINIMIZE_PAYLOAD', '1') == '1' else None,
+)
+
+# Callback timing/size metrics on /metrics (Prometheus text format)
+metrics.install(server)
+metrics.registry.describe('airline_figure_cache', 'gauge', "Figure cache hits, misses, evictions and size.")
+metrics.registry.gauge('airline_figure_cache', lambda: {
+    (('stat', stat),): value for stat, value in figure_cache.stats().items() if stat != 'version'
+})
+
+# gzip/brotli for layout and callback responses (registered after metrics, so it runs first
+# and the response size metric sees the compressed bytes)
+payload.install(server)
+
+# The export files (`python export.py`) are served at /export/ with ETags
+export.install(server, lambda: dataset.current().version, figure_cache)
+
+# Read-only JSON/Arrow endpoints over the aggregates at /api/v1/ (see api.py)
+api.install(server, dataset.current)
+
+# tab5/tab6 figures run as background callbacks when dash[diskcache] is installed (see background.py);
+# their results are cached on disk per dataset version
+background_manager = background.make_manager(cache_by=[lambda: dataset.current().version])
+
+# Once the dataset is open: pin the views pre-rendered by `python export.py` for this version
+# in the figure cache, and import plotly.express (slow to import) before a figure needs it
+def prepare(ds):
+    export.pin(figure_cache, ds.version)
+    import plotly.express  # noqa: F401
+
+# Open the dataset and build its views in a startup thread pool; /ready reports when that's done
+warmup.install(server)
+warmup.start(prepare)
+
+# Contextual information for tab8 (shared by the server and clientside Section 2 renderers)
+def tab8_context_info():
+    return html.Div([
+        html.H5("Insights on Average Fare for Each Selected Airline:", style={'marginTop': '20px'}),
+        html.Ul([
+            html.Li("Separate Lines: Each line represents the average fare trend for a selected airline over time."),
+            html.Li("Comparison: This visualization helps compare the pricing strategies of selected airlines."),
+            html.Li("Insights: Identify consistent pricing patterns or unique fare fluctuations among airlines."),
+        ], style={'fontSize': '14px', 'lineHeight': '1.6'}),
+    ])
+
+# Section 2 is rendered either by the server callback, or (AIRLINE_CLIENTSIDE_FILTERING=1) in the
+# browser by assets/section2.js from the per-carrier prefix sums shipped once in a dcc.Store
+def section2_container(ds):
+    if CLIENTSIDE_SECTION2:
+        return html.Div([
+            dcc.Store(id='section2-store', data=aggregates.encode_period_prefix_sums(ds.period_sums, ds.color_map)),
+            dcc.Graph(id='section2-graph'),
+            html.Div(tab8_context_info(), id='section2-context', style={'display': 'none'}),
+        ], id='section2-tabs-content')
+    return html.Div(id='section2-tabs-content')
+
+# (Year, quarter) range for every Section 2 view; values are aggregates.period_key()s
+def section2_period_slider(ds):
+    periods = ds.period_sums.periods
+    first, last = (int(periods[0]), int(periods[-1])) if len(periods) else (0, 0)
+    # Label every fifth year, and the last year unless it would crowd the previous label
+    first_year, last_year = first // 4, last // 4
+    marks = {max(year * 4, first): str(year) for year in range(first_year, last_year + 1)
+             if (year - first_year) % 5 == 0 or (year == last_year and (year - first_year) % 5 >= 2)}
+    return dcc.RangeSlider(id='section2-period-range', min=first, max=last, step=1, value=[first, last],
+                           marks=marks, allowCross=False)
+
+# None for the full history (so the default view shares one cache entry), else (first, last)
+def normalize_period_range(ds, period_range):
+    periods = ds.period_sums.periods
+    if not period_range or not len(periods):
+        return None
+    first, last = int(period_range[0]), int(period_range[1])
+    if first <= periods[0] and last >= periods[-1]:
+        return None
+    return first, last
+
+def period_title(title, period):
+    if period is None:
+        return title
+    return f"{title}, {aggregates.period_label(period[0])} to {aggregates.period_label(period[1])}"
+
+# Progress bar shown while a background callback computes `name` (hidden otherwise), and the
+# store that hands a cold figure's inputs to that callback (see register_expensive)
+def background_status(name, text):
+    return html.Div([
+        html.Span(text, style={'marginRight': '10px'}),
+        html.Progress(id=f'{name}-progress', value='0', max='1'),
+        dcc.Store(id=f'{name}-job'),
+    ], id=f'{name}-status', style={'display': 'none'})
+
+# App layout, built per page load so the airline list follows the current dataset version
+def serve_layout():
+    ds = dataset.current()
+    return html.Div(
+         style={
+            'backgroundImage': 'url("https://i.pinimg.com/1200x/f5/af/38/f5af38611cd1bda1f68876a13bb6436e.jpg")',
+            'backgroundSize': 'cover',
+            'backgroundPosition': 'center',
+            'minHeight': '100vh',
+            'padding': '20px',
+        },
+        children=[
+        html.H1("Airline Market Visualization Dashboard",
                 style={
+                    'textAlign': 'center',
+                    'color': 'white',
+                    'textShadow': '2px 2px 4px #000000',
+                }),
+
+        # Section 1
+        html.Div([
+            html.H2("Section 1: Default Visualizations",
+                    style={
+                    'textAlign': 'center',
+                    'color': 'white',
+                    'textShadow': '2px 2px 4px #000000',
+                }),
+            dcc.Tabs(id="section1-tabs", value='tab1', children=[
+                dcc.Tab(label='Yearly Fare Trend', value='tab1'),
+                dcc.Tab(label='Average Fare by Airline', value='tab2'),
+                dcc.Tab(label='Quarterly Fare Trends', value='tab3'),
+                dcc.Tab(label='Yearly Market Share', value='tab4'),
+                dcc.Tab(label='Quarterly Market Share by Airline', value='tab5'),
+                dcc.Tab(label='Geographic Route Map', value='tab6'),
+            ]),
+            html.Div(id='section1-tabs-content'),
+        ],style={'backgroundColor': 'rgba(255, 255, 255, 0.8)', 'borderRadius': '10px', 'padding': '15px'}),
+
+        # Section 2
+        html.Div([
+            html.H2("Section 2: Filtered Visualizations",
+                    style={
+                    'textAlign': 'center',
+                    'color': 'white',
+                    'textShadow': '2px 2px 4px #000000',
+                }),
+            html.Label("Select Airlines to Filter:"),
+            dcc.Dropdown(
+                id='airline-dropdown',
+                options=[{'label': airline, 'value': airline} for airline in ds.unique_airlines],
+                multi=True,
+                placeholder="Select one or more airlines",
+            ),
+            html.Label("Select Period (Year, Quarter):"),
+            section2_period_slider(ds),
+            dcc.Tabs(id="section2-tabs", value='tab7', children=[
+                dcc.Tab(label='Filtered Yearly Fare Trend', value='tab7'),
+                dcc.Tab(label='Average Fare Per Airline (Separate Lines)', value='tab8'),
+                dcc.Tab(label='Filtered Yearly Market Share', value='tab9'),
+
+            ], style={'backgroundColor': 'rgba(255, 255, 255, 0.8)', 'borderRadius': '10px', 'padding': '15px'}),
+            section2_container(ds),
+        ], style={'marginTop': '20px'}),
+
+            # Footer
+        html.Div([
+            html.P(
+                "Powered by Dash | Data Source: Airline Statistics - Kaggle | © Amritha Prakash. All rights reserved.",
+                style={'textAlign': 'center', 'color': 'white'}
+            ),
+        html.A(
+            "Kaltura Link: Watch Recording Here",
+            href="https://indiana-my.sharepoint.com/:v:/g/personal/amriprak_iu_edu/Ed2CEn5E_5pDmxdqAlb63qkB6VeunUhBi-kuXesr0y0ipw?nav=eyJyZWZlcnJhbEluZm8iOnsicmVmZXJyYWxBcHAiOiJTdHJlYW1XZWJBcHAiLCJyZWZlcnJhbFZpZXciOiJTaGFyZURpYWxvZy1MaW5rIiwicmVmZXJyYWxBcHBQbGF0Zm9ybSI6IldlYiIsInJlZmVycmFsTW9kZSI6InZpZXcifX0%3D&e=jTosID",  
+            style={
                 'textAlign': 'center',
                 'color': 'white',
-                'textShadow': '2px 2px 4px #000000',
-            }),
-        html.Label("Select Airlines to Filter:"),
-        dcc.Dropdown(
-            id='airline-dropdown',
-            options=[{'label': airline, 'value': airline} for airline in unique_airlines],
-            multi=True,
-            placeholder="Select one or more airlines",
-        ),
-        dcc.Tabs(id="section2-tabs", value='tab7', children=[
-            dcc.Tab(label='Filtered Yearly Fare Trend', value='tab7'),
-            dcc.Tab(label='Average Fare Per Airline (Separate Lines)', value='tab8'),
-            dcc.Tab(label='Filtered Yearly Market Share', value='tab9'),
-
-        ], style={'backgroundColor': 'rgba(255, 255, 255, 0.8)', 'borderRadius': '10px', 'padding': '15px'}),
-        html.Div(id='section2-tabs-content'),
-    ], style={'marginTop': '20px'}),
-
-        # Footer
-    html.Div([
-        html.P(
-            "Powered by Dash | Data Source: Airline Statistics - Kaggle | © Amritha Prakash. All rights reserved.",
-            style={'textAlign': 'center', 'color': 'white'}
-        ),
-    html.A(
-        "Kaltura Link: Watch Recording Here",
-        href="https://indiana-my.sharepoint.com/:v:/g/personal/amriprak_iu_edu/Ed2CEn5E_5pDmxdqAlb63qkB6VeunUhBi-kuXesr0y0ipw?nav=eyJyZWZlcnJhbEluZm8iOnsicmVmZXJyYWxBcHAiOiJTdHJlYW1XZWJBcHAiLCJyZWZlcnJhbFZpZXciOiJTaGFyZURpYWxvZy1MaW5rIiwicmVmZXJyYWxBcHBQbGF0Zm9ybSI6IldlYiIsInJlZmVycmFsTW9kZSI6InZpZXcifX0%3D&e=jTosID",  
-        style={
-            'textAlign': 'center',
-            'color': 'white',
-            'textDecoration': 'underline',
-            'display': 'block',
-            'marginTop': '10px'
-        },
-        target="_blank"  # Opens the link in a new tab
-    )
-    ], style={'marginTop': '30px', 'padding': '10px', 'backgroundColor': '#0D47A1'})     
+                'textDecoration': 'underline',
+                'display': 'block',
+                'marginTop': '10px'
+            },
+            target="_blank"  # Opens the link in a new tab
+        )
+        ], style={'marginTop': '30px', 'padding': '10px', 'backgroundColor': '#0D47A1'})     
      
-])
+    ])
+
+
+app.layout = serve_layout
 
 # Section 1: Callback for rendering default tabs content
 @app.callback(
     Output('section1-tabs-content', 'children'),
     Input('section1-tabs', 'value')
 )
+@metrics.instrument('render_section1_content', tab_arg=0, tabs=export.SECTION1_TABS)
 def render_section1_content(tab):
+    ds = dataset.current()
+    return figure_cache.get_or_build(('section1', tab, ()), ds.version,
+                                     lambda: build_section1_content(ds, tab))
+
+
+def build_section1_content(ds, tab):
+    import plotly.express as px
+
     if tab == 'tab1':  # Yearly Fare Trend
         fig = px.line(
-        yearly_data, x='Year', y='fare',
+        ds.yearly_data, x='Year', y='fare',
         title='Average Fare Over Time (Yearly)',
         labels={'fare': 'Average Fare ($)', 'Year': 'Year'}
         )
 
         # Add annotations for key events
-        fig.add_annotation(x=2020, y=yearly_data[yearly_data['Year'] == 2020]['fare'].values[0],
+        fig.add_annotation(x=2020, y=ds.yearly_data[ds.yearly_data['Year'] == 2020]['fare'].values[0],
                           text="COVID-19 Impact", showarrow=True, arrowhead=1)
-        fig.add_annotation(x=2008, y=yearly_data[yearly_data['Year'] == 2008]['fare'].values[0],
+        fig.add_annotation(x=2008, y=ds.yearly_data[ds.yearly_data['Year'] == 2008]['fare'].values[0],
                           text="2008 Financial Crisis", showarrow=True, arrowhead=1)
 
         # Update layout
@@ -156,8 +259,8 @@ def render_section1_content(tab):
         ], style={'marginTop': '20px'})
 
         fig.add_trace(
-              go.Scatter(x=yearly_data['Year'],
-                        y=yearly_data['fare'].rolling(window=3).mean(),
+              go.Scatter(x=ds.yearly_data['Year'],
+                        y=ds.yearly_data['fare'].rolling(window=3).mean(),
                         mode='lines', name='Trendline', line=dict(dash='dot', color='green'))
           )
 
@@ -169,13 +272,13 @@ def render_section1_content(tab):
 
     elif tab == 'tab2':  # Average Fare by Airline
         fig = px.line(
-        airline_yearly_data, x='Year', y='fare', color='carrier_full',
+        ds.airline_yearly_data, x='Year', y='fare', color='carrier_full',
         title='Average Fare Over Time by Airline',
         labels={'fare': 'Average Fare ($)', 'Year': 'Year', 'carrier_full': 'Airline'},
-        color_discrete_map=global_color_map  # Apply the global color map
+        color_discrete_map=ds.color_map  # Apply the global color map
         )
         # Add industry average line
-        industry_avg = yearly_data[['Year', 'fare']].rename(columns={'fare': 'Industry Average Fare'})
+        industry_avg = ds.yearly_data[['Year', 'fare']].rename(columns={'fare': 'Industry Average Fare'})
         fig.add_trace(
             go.Scatter(x=industry_avg['Year'], y=industry_avg['Industry Average Fare'],
                       mode='lines', name='Industry Average', line=dict(dash='dash', color='black'))
@@ -183,7 +286,7 @@ def render_section1_content(tab):
 
         # Dropdown for filtering airlines (unchanged)
         dropdown_buttons = [{'label': 'All Airlines', 'method': 'update', 'args': [{'visible': [True] * len(fig.data)}]}]
-        for i, airline in enumerate(airline_yearly_data['carrier_full'].unique()):
+        for i, airline in enumerate(ds.airline_yearly_data['carrier_full'].unique()):
             visible = [False] * len(fig.data)
             visible[i] = True
             dropdown_buttons.append({'label': airline, 'method': 'update', 'args': [{'visible': visible}]})
@@ -218,13 +321,13 @@ def render_section1_content(tab):
 
     elif tab == 'tab3':  # Quarterly Fare Trends
         fig = px.line(
-        df_airline, x='quarter', y='fare', color='Year',
+        ds.quarterly_fare_data, x='quarter', y='fare', color='Year',
         title='Quarterly Fare Trends (with Interpolation)',
         labels={'fare': 'Average Fare ($)', 'quarter': 'Quarter'},
-        color_discrete_map=global_color_map  # Apply the global color map
+        color_discrete_map=ds.color_map  # Apply the global color map
         )
         # Add slider for years
-        years = sorted(df_airline['Year'].unique())
+        years = sorted(ds.quarterly_fare_data['Year'].unique())
         fig.update_layout(
             sliders=[{
                 'active': 0,
@@ -235,13 +338,11 @@ def render_section1_content(tab):
         )
         fig.update_layout(hovermode="x unified")
 
-                # Add rolling average line for each year
-        df_airline['rolling_fare'] = df_airline.groupby('Year')['fare'].transform(lambda x: x.rolling(window=2).mean())
-
+        # Add rolling average line for each year (precomputed in quarterly_fare_data)
         fig.add_trace(
             go.Scatter(
-                x=df_airline['quarter'],
-                y=df_airline['rolling_fare'],
+                x=ds.quarterly_fare_data['quarter'],
+                y=ds.quarterly_fare_data['rolling_fare'],
                 mode='lines',
                 name='Trendline (Rolling Average)',
                 line=dict(dash='dot', color='green')
@@ -258,29 +359,30 @@ def render_section1_content(tab):
 
     elif tab == 'tab4':  # Yearly Market Share
         # Calculate total market share for each airline to determine the order
-        airline_order = (
-            market_data.groupby('carrier_full')['large_ms']
-            .sum()
-            .sort_values(ascending=False)
-            .index
-        )
+        with metrics.phase('aggregate'):
+            airline_order = (
+                ds.market_data.groupby('carrier_full', observed=True)['large_ms']
+                .sum()
+                .sort_values(ascending=False)
+                .index
+            )
 
         # Create the bar chart with sorted airlines
         fig = px.bar(
-            market_data,
+            ds.market_data,
             x='Year',
             y='large_ms',
             color='carrier_full',
             category_orders={'carrier_full': list(airline_order)},  # Order airlines by total market share
             title='Market Share by Airline (Yearly)',
             labels={'large_ms': 'Market Share (%)', 'Year': 'Year', 'carrier_full': 'Airline'},
-            color_discrete_map=global_color_map  # Apply the global color map
+            color_discrete_map=ds.color_map  # Apply the global color map
         )
 
         # Add annotations for specific years
         highlight_years = [1995, 2000, 2010, 2020]
         for year in highlight_years:
-            year_data = market_data[market_data['Year'] == year]
+            year_data = ds.market_data[ds.market_data['Year'] == year]
             if not year_data.empty:
                 # Get the airline with the largest market share for the year
                 max_airline = year_data.loc[year_data['large_ms'].idxmax()]
@@ -322,84 +424,18 @@ def render_section1_content(tab):
 
 
     elif tab == 'tab5':  # Quarterly Market Share by Airline with Slider
-        fig = go.Figure()
-
-        # Use global color map
-        color_map = global_color_map
-
-        # Group data by Year, quarter, and airline for quarterly market share
-        quarterly_market_data = df_airline.groupby(['Year', 'quarter', 'carrier_full']).agg({'large_ms': 'mean'}).reset_index()
-
-        # Filter top 5 airlines based on cumulative market share
-        top_5_airlines = quarterly_market_data.groupby('carrier_full')['large_ms'].sum().nlargest(5).index
-        filtered_quarterly_data = quarterly_market_data[quarterly_market_data['carrier_full'].isin(top_5_airlines)]
-
-        # Create a list of unique airlines and assign each a color
-        unique_airlines = top_5_airlines  # Use only the top 5 airlines
-
-        # Create traces for each airline in each year
-        years = sorted(filtered_quarterly_data['Year'].unique())
-        for year in years:
-            data_for_year = filtered_quarterly_data[filtered_quarterly_data['Year'] == year]
-            for airline in unique_airlines:
-                airline_data = data_for_year[data_for_year['carrier_full'] == airline]
-                fig.add_trace(go.Bar(
-                    x=airline_data['quarter'],
-                    y=airline_data['large_ms'],
-                    name=f"{airline} ({year})",
-                    marker=dict(color=color_map[airline]),  # Use global color map
-                    visible=False,  # All traces hidden initially
-                    hovertemplate="Airline: %{text}<br>Market Share: %{y:.2f}%<extra></extra>",
-                    text=[airline] * len(airline_data)  # To display airline name on hover
-                ))
-
-        # Set traces for the first year to be visible by default
-        for i in range(len(unique_airlines)):
-            fig.data[i].visible = True
-
-        # Create slider steps for each year
-        steps = []
-        for i, year in enumerate(years):
-            step = dict(
-                method='update',
-                label=str(year),
-                args=[
-                    {'visible': [((j // len(unique_airlines)) == i) for j in range(len(fig.data))]},  # Show traces for the selected year
-                    {'title': f'Quarterly Market Share by Airline for {year}'}
-                ]
-            )
-            steps.append(step)
-
-        # Add the slider to the layout
-        fig.update_layout(
-            sliders=[{
-                'active': 0,
-                'currentvalue': {'prefix': 'Year: '},
-                'pad': {'t': 50},
-                'steps': steps
-            }],
-            title='Quarterly Market Share by Airline (Top 5 Airlines)',
-            xaxis_title='Quarter',
-            yaxis_title='Market Share (%)',
-            barmode='stack'
-        )
-
-        # Add trendline for the top airline
-        top_airline = top_5_airlines[0]  # Select the top airline based on market share
-        top_airline_data = filtered_quarterly_data[filtered_quarterly_data['carrier_full'] == top_airline]
-
-        fig.add_trace(
-            go.Scatter(
-                x=top_airline_data['quarter'],
-                y=top_airline_data['large_ms'].rolling(window=2).mean(),
-                mode='lines',
-                name=f'Trendline: {top_airline}',
-                line=dict(dash='dot', color='red')
-            )
-        )
-
+        # Only the slider is sent here; render_market_share_year draws the selected year on demand
         return html.Div([
-            dcc.Graph(figure=fig),
+            background_status('market-share', "Drawing market share..."),
+            dcc.Graph(id='market-share-graph'),
+            dcc.Slider(
+                id='market-share-year',
+                min=ds.market_share_years[0],
+                max=ds.market_share_years[-1],
+                step=None,
+                value=ds.market_share_years[0],
+                marks={int(year): str(year) for year in ds.market_share_years},
+            ),
             html.Div([
                 html.P("This chart provides insights into the market dynamics of the top 5 airlines over quarters, highlighting trends and competitive shifts."),
             ], style={'marginTop': '20px', 'fontSize': '14px', 'lineHeight': '1.6'}),
@@ -408,26 +444,33 @@ def render_section1_content(tab):
 
 
     elif tab == 'tab6':  # Geographic Route Map
-        fig = go.Figure()
-
-        # Add traces for top 5 routes with passenger volume determining line width
-        for _, row in top_5_routes.iterrows():
-            fig.add_trace(go.Scattergeo(
-                locationmode='USA-states',
-                lon=[row['lon1'], row['lon2']],
-                lat=[row['lat1'], row['lat2']],
-                mode='lines',
-                name=f"{row['city1']} to {row['city2']}",
-                line=dict(width=row['passengers'] / 100000,
-                          color=f"rgba(0, 0, 255, {row['passengers'] / top_5_routes['passengers'].max()})"),  # Gradient color
-                hoverinfo='text',
-                text=f"Route: {row['city1']} to {row['city2']}<br>Passengers: {row['passengers']}"
-            ))
-
-        fig.update_layout(
-            title="Top 5 Routes by Passenger Volume",
-            geo=dict(scope="usa", showland=True, landcolor="lightgrey")
-        )
+        # Route filters; the map itself is drawn by render_route_map from the precomputed ranking
+        controls = html.Div([
+            html.Div([
+                html.Label("Number of routes:"),
+                dcc.Input(id='route-count', type='number', value=5, min=1, max=len(ds.route_ranking), step=1),
+            ], style={'display': 'inline-block', 'marginRight': '20px'}),
+            html.Div([
+                html.Label("Minimum passengers:"),
+                dcc.Input(id='route-min-passengers', type='number', value=0, min=0, step=1000),
+            ], style={'display': 'inline-block', 'marginRight': '20px'}),
+            html.Div([
+                html.Label("Origin city:"),
+                dcc.Dropdown(
+                    id='route-origin',
+                    options=[{'label': city, 'value': city} for city in ds.route_origins],
+                    placeholder="All origin cities",
+                ),
+            ], style={'display': 'inline-block', 'width': '300px', 'verticalAlign': 'top'}),
+            html.Div([
+                html.Label("Latitude range:"),
+                dcc.RangeSlider(id='route-lat-range', min=ROUTE_MAP_BOUNDS[0], max=ROUTE_MAP_BOUNDS[1], step=1,
+                                value=list(ROUTE_MAP_BOUNDS[:2]), marks=None, tooltip={'placement': 'bottom'}),
+                html.Label("Longitude range:"),
+                dcc.RangeSlider(id='route-lon-range', min=ROUTE_MAP_BOUNDS[2], max=ROUTE_MAP_BOUNDS[3], step=1,
+                                value=list(ROUTE_MAP_BOUNDS[2:]), marks=None, tooltip={'placement': 'bottom'}),
+            ], style={'marginTop': '10px'}),
+        ])
 
         # Add contextual information as HTML
         context_info = html.Div([
@@ -442,33 +485,147 @@ def render_section1_content(tab):
             ], style={'fontSize': '14px', 'lineHeight': '1.6'}),
         ])
 
-        # Return the graph and context together
+        # Return the controls, graph and context together
         return html.Div([
-            dcc.Graph(figure=fig),
+            controls,
+            background_status('route-map', "Drawing routes..."),
+            dcc.Graph(id='route-map'),
             context_info
         ])
 
     return html.Div("Content Not Available.")
 
-# Section 2: Callback for filtered visualizations
-@app.callback(
-    Output('section2-tabs-content', 'children'),
-    [Input('section2-tabs', 'value'), Input('airline-dropdown', 'value')]
-)
-def render_section2_content(tab, selected_airlines):
+# Section 1: Callback for the quarterly market share slider (tab5, registered below)
+def market_share_year_key(year):
+    return ('market-share', 'tab5', year)
+
+@metrics.instrument('render_market_share_year', tab='tab5')
+def render_market_share_year(year, progress=None):
+    ds = dataset.current()
+    return figure_cache.get_or_build(market_share_year_key(year), ds.version,
+                                     lambda: build_market_share_year(ds, year, progress))
+
+
+def build_market_share_year(ds, year, progress=None):
+    fig = go.Figure()
+    year_data = ds.quarterly_market_by_year.get(year)
+    if year_data is None:
+        return fig
+    background.report(progress, 1, 3)
+
+    # One bar trace per top-5 airline for the selected year only
+    for airline in ds.top_5_market_airlines:
+        airline_data = year_data[year_data['carrier_full'] == airline]
+        fig.add_trace(go.Bar(
+            x=airline_data['quarter'],
+            y=airline_data['large_ms'],
+            name=str(airline),
+            marker=dict(color=ds.color_map[airline]),  # Use global color map
+            hovertemplate="Airline: %{text}<br>Market Share: %{y:.2f}%<extra></extra>",
+            text=[airline] * len(airline_data)  # To display airline name on hover
+        ))
+
+    background.report(progress, 2, 3)
+
+    # Add trendline for the top airline
+    top_airline = ds.top_5_market_airlines[0]  # Select the top airline based on market share
+    top_airline_data = year_data[year_data['carrier_full'] == top_airline]
+    fig.add_trace(
+        go.Scatter(
+            x=top_airline_data['quarter'],
+            y=top_airline_data['large_ms'].rolling(window=2).mean(),
+            mode='lines',
+            name=f'Trendline: {top_airline}',
+            line=dict(dash='dot', color='red')
+        )
+    )
+
+    fig.update_layout(
+        title=f'Quarterly Market Share by Airline for {year}',
+        xaxis_title='Quarter',
+        yaxis_title='Market Share (%)',
+        barmode='stack'
+    )
+    return fig
+
+
+# Section 1: Callback for the route map (tab6, registered below)
+def route_map_bbox(lat_range, lon_range):
+    if lat_range and lon_range and list(lat_range) + list(lon_range) != list(ROUTE_MAP_BOUNDS):
+        return (lat_range[0], lat_range[1], lon_range[0], lon_range[1])
+    return None
+
+def route_map_key(route_count, min_passengers, origin, lat_range, lon_range):
+    return ('route-map', 'tab6', (route_count, min_passengers, origin, route_map_bbox(lat_range, lon_range)))
+
+@metrics.instrument('render_route_map', tab='tab6')
+def render_route_map(route_count, min_passengers, origin, lat_range, lon_range, progress=None):
+    bbox = route_map_bbox(lat_range, lon_range)
+    key = route_map_key(route_count, min_passengers, origin, lat_range, lon_range)
+    ds = dataset.current()
+    return figure_cache.get_or_build(key, ds.version,
+                                     lambda: build_route_map(ds, route_count, min_passengers, origin, bbox, progress))
+
+
+def build_route_map(ds, route_count, min_passengers, origin, bbox, progress=None):
+    with metrics.phase('aggregate'):
+        positions = ds.route_ranking.select(n=route_count or None, min_passengers=min_passengers, origin=origin, bbox=bbox)
+        background.report(progress, 1, 3)
+        batches = routes.route_trace_batches(ds.route_ranking, positions)
+    background.report(progress, 2, 3)
+    fig = go.Figure()
+
+    # One batched trace per passenger-volume bucket; wider, more opaque lines carry more passengers
+    for batch in batches:
+        strength = (batch['bucket'] + 1) / batch['n_buckets']
+        fig.add_trace(go.Scattergeo(
+            locationmode='USA-states',
+            lon=batch['lon'],
+            lat=batch['lat'],
+            mode='lines',
+            name=f"{batch['min_passengers']:,}-{batch['max_passengers']:,} passengers ({batch['routes']} routes)",
+            line=dict(width=1 + 4 * strength, color=f"rgba(0, 0, 255, {0.2 + 0.8 * strength:.2f})"),
+            hoverinfo='text',
+            text=batch['text'],
+        ))
+
+    fig.update_layout(
+        title=f"Top {len(positions):,} Routes by Passenger Volume",
+        geo=dict(scope="usa", showland=True, landcolor="lightgrey")
+    )
+    return fig
+
+# Section 2: Callback for filtered visualizations (registered below unless filtering runs clientside)
+@metrics.instrument('render_section2_content', tab_arg=0, selection_arg=1, tabs=export.SECTION2_TABS)
+def render_section2_content(tab, selected_airlines, period_range=None):
+    ds = dataset.current()
+    selection = normalize_selection(selected_airlines)
+    period = normalize_period_range(ds, period_range)
+    key = ('section2', tab, selection) if period is None else ('section2', tab, selection, period)
+    return figure_cache.get_or_build(key, ds.version,
+                                     lambda: build_section2_content(ds, tab, list(selection), period))
+
+
+# Roll-ups come from the per-carrier prefix sums: a period range costs one subtraction per
+# (year, carrier), never a scan of the cube
+def build_section2_content(ds, tab, selected_airlines, period=None):
+    import plotly.express as px
+
+    first, last = period or (None, None)
     if tab == 'tab7':  # Filtered Yearly Fare Trend
-        filtered_data = df_airline[df_airline['carrier_full'].isin(selected_airlines)] if selected_airlines else df_airline
-        yearly_filtered_data = filtered_data.groupby(['Year']).agg({'fare': 'mean'}).reset_index()
-        fig = px.line(yearly_filtered_data, x='Year', y='fare', title='Filtered Average Fare Over Time (Yearly)',
+        with metrics.phase('aggregate'):
+            yearly_filtered_data = ds.period_sums.rollup(['Year'], {'fare': 'mean'}, selected_airlines, first, last)
+        fig = px.line(yearly_filtered_data, x='Year', y='fare',
+                      title=period_title('Filtered Average Fare Over Time (Yearly)', period),
                       labels={'fare': 'Average Fare ($)', 'Year': 'Year'},
-                      color_discrete_map=global_color_map
+                      color_discrete_map=ds.color_map
                       )
         return html.Div([dcc.Graph(figure=fig)])
 
     elif tab == 'tab8':  # Average Fare Line Plot for Each Selected Airline
-        # Filter data based on selected airlines
-        filtered_data = df_airline[df_airline['carrier_full'].isin(selected_airlines)] if selected_airlines else df_airline
-        yearly_filtered_data = filtered_data.groupby(['Year', 'carrier_full']).agg({'fare': 'mean'}).reset_index()
+        # Roll up the selected airlines over the selected periods
+        with metrics.phase('aggregate'):
+            yearly_filtered_data = ds.period_sums.rollup(['Year', 'carrier_full'], {'fare': 'mean'}, selected_airlines, first, last)
 
         # Create line plot for each selected airline
         fig = px.line(
@@ -476,9 +633,9 @@ def render_section2_content(tab, selected_airlines):
             x='Year',
             y='fare',
             color='carrier_full',
-            title='Average Fare by Airline (Separate Lines)',
+            title=period_title('Average Fare by Airline (Separate Lines)', period),
             labels={'fare': 'Average Fare ($)', 'Year': 'Year', 'carrier_full': 'Airline'},
-            color_discrete_map=global_color_map  # Apply consistent colors
+            color_discrete_map=ds.color_map  # Apply consistent colors
         )
 
         # Update layout for clarity
@@ -488,35 +645,94 @@ def render_section2_content(tab, selected_airlines):
             legend_title="Airlines"
         )
 
-        # Add contextual information as HTML
-        context_info = html.Div([
-            html.H5("Insights on Average Fare for Each Selected Airline:", style={'marginTop': '20px'}),
-            html.Ul([
-                html.Li("Separate Lines: Each line represents the average fare trend for a selected airline over time."),
-                html.Li("Comparison: This visualization helps compare the pricing strategies of selected airlines."),
-                html.Li("Insights: Identify consistent pricing patterns or unique fare fluctuations among airlines."),
-            ], style={'fontSize': '14px', 'lineHeight': '1.6'}),
-        ])
-
         return html.Div([
             dcc.Graph(figure=fig),
-            context_info
+            tab8_context_info()
         ])
 
     elif tab == 'tab9':  # Filtered Yearly Market Share
-        filtered_data = market_data[market_data['carrier_full'].isin(selected_airlines)] if selected_airlines else market_data
-        airline_order = (filtered_data.groupby('carrier_full')['large_ms'].sum().sort_values(ascending=False).index)
+        with metrics.phase('aggregate'):
+            filtered_data = ds.period_sums.rollup(['Year', 'carrier_full'], {'large_ms': 'mean'}, selected_airlines, first, last)
+            airline_order = (filtered_data.groupby('carrier_full', observed=True)['large_ms'].sum().sort_values(ascending=False).index)
         fig = px.bar(filtered_data, x='Year', y='large_ms', color='carrier_full',
-                     title='Filtered Yearly Market Share by Airline',
+                     title=period_title('Filtered Yearly Market Share by Airline', period),
                      labels={'large_ms': 'Market Share (%)', 'Year': 'Year', 'carrier_full': 'Airline'},
-                     color_discrete_map=global_color_map,
+                     color_discrete_map=ds.color_map,
                      category_orders={'carrier_full': list(airline_order)})
         return html.Div([dcc.Graph(figure=fig)])
 
     return html.Div("Content Not Available.")
 
+
+# Register an expensive section 1 callback: in the background (with a progress bar, cancelled
+# when the user switches tabs) when a manager is available, otherwise in the request thread.
+# key(*inputs) is the figure's cache key in fn
+def register_expensive(fn, output, inputs, name, key):
+    if background_manager is None:
+        app.callback(output, inputs)(fn)
+        return
+
+    run_job = background.with_progress(fn)
+    app.callback(
+        Output(output.component_id, output.component_property, allow_duplicate=True),
+        Input(f'{name}-job', 'data'),
+        background=True,
+        manager=background_manager,
+        interval=background.POLL_INTERVAL_MS,
+        running=[(Output(f'{name}-status', 'style'), {'display': 'block'}, {'display': 'none'})],
+        progress=[Output(f'{name}-progress', 'value'), Output(f'{name}-progress', 'max')],
+        cancel=[Input('section1-tabs', 'value')],
+        prevent_initial_call=True,
+    )(run_job)
+
+    # Answer a cached figure right away; only a cold one is handed to the background job
+    @app.callback(output, Output(f'{name}-job', 'data'), inputs)
+    def serve_cached(*args):
+        ds = dataset.current()
+        cache_key = key(*args)
+        value = figure_cache.peek(cache_key, ds.version)
+        if value is None:
+            value = background.stored_result(background_manager, run_job, list(args))
+            if value is not None:
+                figure_cache.put(cache_key, ds.version, value)
+        if value is None:
+            return dash.no_update, list(args)
+        return value, dash.no_update
+
+
+register_expensive(
+    render_market_share_year,
+    Output('market-share-graph', 'figure'),
+    [Input('market-share-year', 'value')],
+    'market-share',
+    market_share_year_key,
+)
+register_expensive(
+    render_route_map,
+    Output('route-map', 'figure'),
+    [Input('route-count', 'value'), Input('route-min-passengers', 'value'), Input('route-origin', 'value'),
+     Input('route-lat-range', 'value'), Input('route-lon-range', 'value')],
+    'route-map',
+    route_map_key,
+)
+
+if CLIENTSIDE_SECTION2:
+    app.clientside_callback(
+        ClientsideFunction(namespace='section2', function_name='render'),
+        [Output('section2-graph', 'figure'), Output('section2-context', 'style')],
+        [Input('section2-tabs', 'value'), Input('airline-dropdown', 'value'), Input('section2-period-range', 'value')],
+        State('section2-store', 'data')
+    )
+else:
+    app.callback(
+        Output('section2-tabs-content', 'children'),
+        [Input('section2-tabs', 'value'), Input('airline-dropdown', 'value'), Input('section2-period-range', 'value')]
+    )(render_section2_content)
+
 # Run the app
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    refresh.start_from_env()
     app.run_server(debug=False)
 
 
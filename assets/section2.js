@@ -0,0 +1,159 @@
+// Clientside rendering for Section 2 (enabled with AIRLINE_CLIENTSIDE_FILTERING=1).
+//
+// The server ships per-carrier running totals over (Year, quarter) periods once in the
+// `section2-store` dcc.Store (see aggregates.encode_period_prefix_sums); filtering by the
+// airline dropdown and the period range, and re-aggregating for tab7/tab8/tab9, happens
+// here in the browser. Each (year, carrier) value is one subtraction of running totals.
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    section2: {
+        render: function (tab, selectedAirlines, periodRange, table) {
+            var noUpdate = window.dash_clientside.no_update;
+            if (!table) {
+                return [noUpdate, noUpdate];
+            }
+
+            var selected = null;
+            if (selectedAirlines && selectedAirlines.length) {
+                selected = {};
+                selectedAirlines.forEach(function (airline) { selected[airline] = true; });
+            }
+
+            // Positions [start, stop) of the periods inside the range
+            var periods = table.periods;
+            var start = 0, stop = periods.length;
+            if (periodRange) {
+                while (start < periods.length && periods[start] < periodRange[0]) { start++; }
+                stop = start;
+                while (stop < periods.length && periods[stop] <= periodRange[1]) { stop++; }
+            }
+            var restricted = start > 0 || stop < periods.length;
+
+            // Year boundaries inside the range; edge years only count their selected quarters
+            var years = [], edges = [start];
+            for (var p = start; p < stop; p++) {
+                var year = Math.floor(periods[p] / 4);
+                if (!years.length || years[years.length - 1] !== year) {
+                    if (years.length) { edges.push(p); }
+                    years.push(year);
+                }
+            }
+            edges.push(stop);
+
+            // Selected carriers, in store order
+            var carriers = [];
+            for (var c = 0; c < table.carriers.length; c++) {
+                if (!selected || selected[table.carriers[c]]) {
+                    carriers.push(c);
+                }
+            }
+
+            function total(column, c, y) {
+                return table[column][c][edges[y + 1]] - table[column][c][edges[y]];
+            }
+
+            function periodLabel(key) {
+                return Math.floor(key / 4) + ' Q' + (key % 4 + 1);
+            }
+
+            function title(text) {
+                if (!restricted) {
+                    return text;
+                }
+                return text + ', ' + periodLabel(periodRange[0]) + ' to ' + periodLabel(periodRange[1]);
+            }
+
+            function mean(sum, count) {
+                return count > 0 ? sum / count : null;
+            }
+
+            var layout = {
+                xaxis: {title: {text: 'Year'}},
+                legend: {title: {text: 'Airline'}, tracegroupgap: 0},
+                template: {layout: {plot_bgcolor: '#E5ECF6', xaxis: {gridcolor: 'white'}, yaxis: {gridcolor: 'white'}}}
+            };
+            var hidden = {display: 'none'};
+
+            if (tab === 'tab7') {  // Filtered Yearly Fare Trend
+                var x = [], y = [];
+                years.forEach(function (year, i) {
+                    var sum = 0, count = 0, present = false;
+                    carriers.forEach(function (c) {
+                        if (total('rows', c, i) > 0) {
+                            present = true;
+                            sum += total('fare_sum', c, i);
+                            count += total('fare_count', c, i);
+                        }
+                    });
+                    if (present) {
+                        x.push(year);
+                        y.push(mean(sum, count));
+                    }
+                });
+                layout.title = {text: title('Filtered Average Fare Over Time (Yearly)')};
+                layout.yaxis = {title: {text: 'Average Fare ($)'}};
+                return [{
+                    data: [{
+                        type: 'scatter', mode: 'lines', x: x, y: y,
+                        hovertemplate: 'Year=%{x}<br>Average Fare ($)=%{y}<extra></extra>'
+                    }],
+                    layout: layout
+                }, hidden];
+            }
+
+            // tab8/tab9: one series per carrier over the years it has rows in the range
+            var series = {};
+            carriers.forEach(function (c) {
+                series[c] = [];
+                years.forEach(function (year, i) {
+                    if (total('rows', c, i) > 0) {
+                        series[c].push(i);
+                    }
+                });
+            });
+            carriers = carriers.filter(function (c) { return series[c].length > 0; });
+
+            function traces(type, sumColumn, countColumn, label) {
+                return carriers.map(function (c) {
+                    var name = table.carriers[c];
+                    var trace = {
+                        type: type, name: name, legendgroup: name,
+                        x: series[c].map(function (i) { return years[i]; }),
+                        y: series[c].map(function (i) { return mean(total(sumColumn, c, i), total(countColumn, c, i)); }),
+                        hovertemplate: 'Airline=' + name + '<br>Year=%{x}<br>' + label + '=%{y}<extra></extra>'
+                    };
+                    if (type === 'bar') {
+                        trace.marker = {color: table.colors[c]};
+                    } else {
+                        trace.mode = 'lines';
+                        trace.line = {color: table.colors[c]};
+                    }
+                    return trace;
+                });
+            }
+
+            if (tab === 'tab8') {  // Average Fare Per Airline (Separate Lines)
+                layout.title = {text: title('Average Fare by Airline (Separate Lines)'), x: 0.5};
+                layout.yaxis = {title: {text: 'Average Fare ($)'}};
+                layout.hovermode = 'x unified';
+                layout.legend.title.text = 'Airlines';
+                return [{data: traces('scatter', 'fare_sum', 'fare_count', 'Average Fare ($)'), layout: layout},
+                        {display: 'block'}];
+            }
+
+            if (tab === 'tab9') {  // Filtered Yearly Market Share, stacked by total share
+                var data = traces('bar', 'large_ms_sum', 'large_ms_count', 'Market Share (%)');
+                function share(trace) {
+                    return trace.y.reduce(function (acc, v) { return acc + (v || 0); }, 0);
+                }
+                data.sort(function (a, b) { return share(b) - share(a); });
+                layout.title = {text: title('Filtered Yearly Market Share by Airline')};
+                layout.yaxis = {title: {text: 'Market Share (%)'}};
+                layout.barmode = 'relative';
+                return [{data: data, layout: layout}, hidden];
+            }
+
+            return [{data: [], layout: {title: {text: 'Content Not Available.'}}}, hidden];
+        }
+    }
+});
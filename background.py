@@ -0,0 +1,63 @@
+import functools
+import os
+import tempfile
+
+try:
+    import diskcache
+    from dash import DiskcacheManager
+except ImportError:  # optional; expensive callbacks run in the request thread without it
+    diskcache = None
+
+# Background execution for the expensive callbacks (tab5 market share, tab6 route map).
+#
+# With `pip install "dash[diskcache]"` these run as Dash background callbacks: the
+# request thread only starts a job in a forked process (which shares the loaded dataset
+# copy-on-write) and the browser polls for the result, so a cold figure no longer holds a
+# worker thread. Results are kept in a diskcache on local disk, keyed by the callback
+# arguments and the dataset version, so every gunicorn worker reuses them. A job is
+# cancelled when its inputs change again or the user switches section 1 tabs.
+#
+# A figure that is already in the figure cache (pinned exports included) or among the
+# stored results is answered in the request thread; only a cold figure starts a job.
+
+ENABLED = os.environ.get('AIRLINE_BACKGROUND_CALLBACKS', '1') == '1'
+CACHE_DIR = os.environ.get('AIRLINE_BACKGROUND_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'airline-background'))
+CACHE_EXPIRE = int(os.environ.get('AIRLINE_BACKGROUND_CACHE_EXPIRE', 3600))
+POLL_INTERVAL_MS = int(os.environ.get('AIRLINE_BACKGROUND_POLL_MS', 250))
+
+
+# DiskcacheManager, or None when disabled or the extra isn't installed.
+# cache_by: zero-argument functions whose values are part of every result key
+def make_manager(cache_by=None):
+    if not ENABLED or diskcache is None:
+        return None
+    try:
+        return DiskcacheManager(diskcache.Cache(CACHE_DIR), cache_by=cache_by, expire=CACHE_EXPIRE)
+    except ImportError:  # psutil/multiprocess missing
+        return None
+
+
+# Dash passes a background callback's progress setter as its first argument, then the job
+# (the render function's arguments, see app.register_expensive); the render functions take
+# the setter as the `progress` keyword instead
+def with_progress(fn):
+    @functools.wraps(fn)
+    def wrapper(set_progress, job):
+        return fn(*job, progress=set_progress)
+    return wrapper
+
+
+# The result a finished job of the background callback `callback` (as registered) stored for
+# `job`, or None. Results are shared by every worker, so a figure another worker already
+# drew needs no job here
+def stored_result(manager, callback, job):
+    result = manager.handle.get(manager.build_cache_key(callback, [job], []))
+    if not isinstance(result, dict) or 'long_callback_error' in result or '_dash_no_update' in result:
+        return None
+    return result
+
+
+# Report step/total to the progress outputs (an html.Progress value and max), if any
+def report(progress, step, total):
+    if progress is not None:
+        progress((str(step), str(total)))
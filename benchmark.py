@@ -0,0 +1,232 @@
+import argparse
+import hashlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import snapshot
+
+# Callback latency benchmarks on synthetic datasets.
+#
+#   python benchmark.py --rows 10000 100000 1000000 --output bench.json
+#   python benchmark.py --compare before.json after.json
+#
+# For every dataset size a synthetic snapshot matching the real schema is written to a
+# temporary directory, then fresh interpreters import app.py against it to measure startup
+# (cold: aggregates built, warm: aggregates already cached) and per-callback latency
+# percentiles, peak traced memory and serialized payload size. Results are JSON.
+
+CARRIERS = [
+    'American Airlines', 'Delta Air Lines', 'United Airlines', 'Southwest Airlines',
+    'Alaska Airlines', 'JetBlue Airways', 'Spirit Air Lines', 'Frontier Airlines',
+    'Allegiant Air', 'Hawaiian Airlines', 'Sun Country Airlines', 'US Airways',
+    'Continental Air Lines', 'Northwest Airlines', 'AirTran Airways',
+]
+
+
+# Synthetic rows with the columns and value ranges of the real dataset
+def generate_dataset(rows, n_cities=400, seed=0):
+    rng = np.random.default_rng(seed)
+
+    city_names = np.array([f"City {i}, ST" for i in range(n_cities)], dtype=object)
+    city_lat = rng.uniform(25, 49, n_cities).round(6)
+    city_lon = rng.uniform(-124, -67, n_cities).round(6)
+    geocodes = np.array([f"({lat}, {lon})" for lat, lon in zip(city_lat, city_lon)], dtype=object)
+
+    # Skewed city popularity so a few routes dominate, as in the real data
+    weights = 1.0 / np.arange(1, n_cities + 1)
+    weights /= weights.sum()
+    origin = rng.choice(n_cities, rows, p=weights)
+    destination = (origin + rng.integers(1, n_cities, rows)) % n_cities
+
+    df = pd.DataFrame({
+        'Year': rng.integers(1993, 2025, rows),
+        'quarter': rng.integers(1, 5, rows),
+        'carrier_full': pd.Categorical.from_codes(rng.integers(0, len(CARRIERS), rows), categories=CARRIERS),
+        'city1': pd.Categorical.from_codes(origin, categories=city_names),
+        'city2': pd.Categorical.from_codes(destination, categories=city_names),
+        'Geocoded_City1': pd.Categorical.from_codes(origin, categories=geocodes),
+        'Geocoded_City2': pd.Categorical.from_codes(destination, categories=geocodes),
+        'fare': rng.gamma(9.0, 25.0, rows).round(2),
+        'passengers': rng.integers(0, 5000, rows),
+        'large_ms': rng.uniform(0.1, 1.0, rows).round(4),
+    })
+    return df
+
+
+def write_synthetic_snapshot(rows, snapshot_dir, seed=0):
+    df = snapshot.apply_schema(generate_dataset(rows, seed=seed))
+    source = f'synthetic://rows={rows}&seed={seed}'
+    return snapshot.write_snapshot(df, hashlib.sha256(source.encode()).hexdigest(), snapshot_dir, source)
+
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1000.0
+    return {
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p90_ms': float(np.percentile(samples, 90)),
+        'p99_ms': float(np.percentile(samples, 99)),
+        'mean_ms': float(samples.mean()),
+    }
+
+
+# ---- Runs inside a fresh interpreter pointed at one synthetic snapshot ----
+
+def _worker_startup():
+    start = time.perf_counter()
+    import app
+    elapsed = time.perf_counter() - start
+    # The dataset is opened and its views built by the startup thread pool after the import
+    app.warmup.wait()
+    ready = time.perf_counter() - start
+    return {'import_s': elapsed, 'ready_s': ready, 'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+def _callback_cases(app):
+    ds = app.dataset.current()
+    carriers = list(ds.unique_airlines)
+    selections = {'all': None, 'one': carriers[:1], 'three': carriers[:3], 'every': carriers}
+
+    cases = [(f'section1/{tab}', app.render_section1_content, (tab,))
+             for tab in ('tab1', 'tab2', 'tab3', 'tab4', 'tab5', 'tab6')]
+    cases.append(('market-share/first-year', app.render_market_share_year, (ds.market_share_years[0],)))
+    cases.append(('route-map/top5', app.render_route_map, (5, 0, None, None, None)))
+    cases.append(('route-map/all', app.render_route_map, (None, 0, None, None, None)))
+    for tab in ('tab7', 'tab8', 'tab9'):
+        for label, selection in selections.items():
+            cases.append((f'section2/{tab}/{label}', app.render_section2_content, (tab, selection)))
+        # A mid-history range that starts and ends mid-year
+        periods = ds.period_sums.periods
+        period_range = [int(periods[len(periods) // 4 + 1]), int(periods[3 * len(periods) // 4 - 1])]
+        cases.append((f'section2/{tab}/range', app.render_section2_content, (tab, None, period_range)))
+    return cases
+
+
+def _worker_callbacks(repeat):
+    import tracemalloc
+
+    import plotly
+
+    import app
+
+    results = {}
+    for name, callback, args in _callback_cases(app):
+        cold = []
+        for _ in range(repeat):
+            app.figure_cache.invalidate()
+            start = time.perf_counter()
+            response = callback(*args)
+            cold.append(time.perf_counter() - start)
+
+        warm = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            callback(*args)
+            warm.append(time.perf_counter() - start)
+
+        app.figure_cache.invalidate()
+        tracemalloc.start()
+        callback(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results[name] = {
+            'cold': percentiles(cold),
+            'cached': percentiles(warm),
+            'peak_traced_bytes': peak,
+            'payload_bytes': len(json.dumps(response, cls=plotly.utils.PlotlyJSONEncoder)),
+        }
+    return results
+
+
+# ---- Orchestration ----
+
+def _run_worker(mode, snapshot_dir, repeat):
+    env = dict(os.environ, AIRLINE_SNAPSHOT_DIR=snapshot_dir)
+    command = [sys.executable, os.path.abspath(__file__), '--worker', mode, '--repeat', str(repeat)]
+    output = subprocess.run(command, env=env, check=True, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(rows_list, repeat):
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'datasets': {},
+    }
+    for rows in rows_list:
+        with tempfile.TemporaryDirectory(prefix='airline-bench-') as snapshot_dir:
+            start = time.perf_counter()
+            write_synthetic_snapshot(rows, snapshot_dir)
+            generate_s = time.perf_counter() - start
+
+            cold_start = _run_worker('startup', snapshot_dir, repeat)  # builds and caches aggregates
+            warm_start = _run_worker('startup', snapshot_dir, repeat)  # maps the cached aggregates
+            callbacks = _run_worker('callbacks', snapshot_dir, repeat)
+
+        report['datasets'][str(rows)] = {
+            'rows': rows,
+            'generate_s': generate_s,
+            'startup_cold': cold_start,
+            'startup_warm': warm_start,
+            'callbacks': callbacks,
+        }
+        print(f"{rows:>10} rows: cold import {cold_start['import_s']:.2f}s (ready {cold_start['ready_s']:.2f}s), "
+              f"warm import {warm_start['import_s']:.2f}s (ready {warm_start['ready_s']:.2f}s)", file=sys.stderr)
+    return report
+
+
+# p50 ratios (after / before) for every case present in both reports
+def compare(before, after):
+    rows = []
+    for size, dataset in after['datasets'].items():
+        previous = before['datasets'].get(size)
+        if previous is None:
+            continue
+        for key in ('startup_cold', 'startup_warm'):
+            rows.append((size, key, previous[key]['import_s'], dataset[key]['import_s']))
+            if 'ready_s' in previous[key] and 'ready_s' in dataset[key]:
+                rows.append((size, f'{key}/ready', previous[key]['ready_s'], dataset[key]['ready_s']))
+        for name, result in dataset['callbacks'].items():
+            if name in previous['callbacks']:
+                rows.append((size, name, previous['callbacks'][name]['cold']['p50_ms'] / 1000.0,
+                             result['cold']['p50_ms'] / 1000.0))
+    return pd.DataFrame(rows, columns=['rows', 'case', 'before_s', 'after_s']).assign(
+        ratio=lambda frame: (frame['after_s'] / frame['before_s']).round(3))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark dashboard startup and callbacks on synthetic data.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help="Dataset sizes to generate (e.g. 10000 100000 1000000 10000000)")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed calls per callback case")
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="Compare two JSON reports")
+    parser.add_argument('--worker', choices=['startup', 'callbacks'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker == 'startup':
+        print(json.dumps(_worker_startup()))
+    elif args.worker == 'callbacks':
+        print(json.dumps(_worker_callbacks(args.repeat)))
+    elif args.compare:
+        with open(args.compare[0]) as f_before, open(args.compare[1]) as f_after:
+            print(compare(json.load(f_before), json.load(f_after)).to_string(index=False))
+    else:
+        result = run(args.rows, args.repeat)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(result, f, indent=2)
+        else:
+            print(json.dumps(result, indent=2))
@@ -0,0 +1,217 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from plotly.colors import qualitative
+
+import aggregates
+import routes
+import snapshot
+
+# Everything the callbacks read, derived from one version of the data.
+#
+# A Dataset's views never change once built. A refresh folds new rows into the
+# aggregates of the current Dataset, builds a new one and publishes it with a single
+# reference swap, so a callback that took `current()` at its start keeps reading one
+# consistent version even if a refresh lands halfway through.
+#
+# Nothing is derived up front: each view is built on first use (see `derived`), and
+# current() opens the snapshot on first call, so importing the app does no data work.
+# warmup.py builds the views in a thread pool at startup.
+
+# Define a colorblind-friendly palette
+COLOR_PALETTE = qualitative.Safe
+
+
+# Attribute computed on first access and then stored on the instance. Unlike
+# functools.cached_property (3.11) it takes no lock: two threads racing on a cold view
+# may both build it, but a process forked mid-build (background callbacks) never
+# inherits a held lock.
+class derived:
+    def __init__(self, build):
+        self.build = build
+        self.name = build.__name__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = self.build(instance)
+        instance.__dict__[self.name] = value
+        return value
+
+
+class Dataset:
+    def __init__(self, version, cube, route_data, airlines, color_map=None):
+        self.version = version
+        # The cube and route table may be given as zero-argument functions, called on first use
+        self._cube = cube
+        self._route_data = route_data
+
+        # Map each airline to a color; airlines keep their color across refreshes
+        self.unique_airlines = list(airlines)
+        self.color_map = dict(color_map or {})
+        for airline in self.unique_airlines:
+            if airline not in self.color_map:
+                self.color_map[airline] = COLOR_PALETTE[len(self.color_map) % len(COLOR_PALETTE)]
+
+    # (Year, quarter, carrier) sums/counts; every fare/market view below is a roll-up of it
+    @derived
+    def airline_cube(self):
+        return self._cube() if callable(self._cube) else self._cube
+
+    @derived
+    def yearly_data(self):
+        return aggregates.rollup(self.airline_cube, ['Year'], {'fare': 'mean', 'passengers': 'sum', 'large_ms': 'mean'})
+
+    @derived
+    def airline_yearly_data(self):
+        return aggregates.rollup(self.airline_cube, ['Year', 'carrier_full'], {'fare': 'mean'})
+
+    @derived
+    def market_data(self):
+        return aggregates.rollup(self.airline_cube, ['Year', 'carrier_full'], {'large_ms': 'mean'})
+
+    # Top 5 airlines' quarterly market share, pre-split by year for the tab5 slider
+    @derived
+    def _quarterly_market(self):
+        return aggregates.quarterly_market_share_by_year(self.airline_cube)
+
+    @derived
+    def top_5_market_airlines(self):
+        return self._quarterly_market[0]
+
+    @derived
+    def quarterly_market_by_year(self):
+        return self._quarterly_market[1]
+
+    @derived
+    def market_share_years(self):
+        return sorted(self.quarterly_market_by_year)
+
+    # Read-only per-(Year, quarter) fare series with its rolling average (tab3)
+    @derived
+    def quarterly_fare_data(self):
+        return aggregates.quarterly_fare_series(self.airline_cube)
+
+    # Per-carrier running totals over (Year, quarter), for the Section 2 period range
+    @derived
+    def period_sums(self):
+        return aggregates.PeriodPrefixSums(self.airline_cube)
+
+    # Latest (Year, quarter) present, used as the refresh watermark
+    @derived
+    def watermark(self):
+        periods = self.airline_cube[['Year', 'quarter']].dropna().sort_values(['Year', 'quarter'])
+        return tuple(int(v) for v in periods.iloc[-1]) if not periods.empty else None
+
+    @derived
+    def route_data(self):
+        return self._route_data() if callable(self._route_data) else self._route_data
+
+    # Routes ranked once by passenger volume; the route map slices this instead of re-sorting
+    @derived
+    def route_ranking(self):
+        return routes.RouteRanking(self.route_data)
+
+    @derived
+    def route_origins(self):
+        return sorted(self.route_ranking.routes['city1'].astype(str).unique())
+
+    @derived
+    def top_5_routes(self):
+        return self.route_ranking.top(5)
+
+    # Every view the callbacks read, in stages: each view only depends on views of earlier
+    # stages, so building one stage in parallel never builds a shared input twice
+    STAGES = (
+        ('airline_cube', 'route_data'),
+        ('yearly_data', 'airline_yearly_data', 'market_data', '_quarterly_market', 'quarterly_fare_data',
+         'period_sums', 'watermark', 'route_ranking'),
+        ('top_5_market_airlines', 'quarterly_market_by_year', 'route_origins', 'top_5_routes'),
+        ('market_share_years',),
+    )
+    DERIVED = tuple(name for stage in STAGES for name in stage)
+
+    # Views not built yet
+    def pending(self):
+        return [name for name in self.DERIVED if name not in self.__dict__]
+
+    # Build every view now, one stage at a time on `workers` threads
+    def derive_all(self, workers=1):
+        if workers <= 1:
+            for name in self.DERIVED:
+                getattr(self, name)
+            return self
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='airline-derive') as pool:
+            for stage in self.STAGES:
+                list(pool.map(lambda name: getattr(self, name), stage))
+        return self
+
+    # Build from the raw snapshot rows; the cube and route table are cached next to the snapshot
+    # and memory-mapped, so forked workers share one copy
+    @classmethod
+    def from_snapshot(cls, df, manifest):
+        version = manifest['version']
+
+        def rows():
+            if manifest.get('layout') == 'aggregates':
+                # Streamed snapshots keep no rows; their cube and routes were written at ingest
+                raise FileNotFoundError(f"Snapshot {version} has no rows to rebuild aggregates from; "
+                                        "re-run `python snapshot.py --streaming --force`.")
+            return df
+
+        def build_route_data():
+            # Each distinct geocode string is parsed once; routes join against the index by integer code
+            city_index = routes.CityIndex.from_columns(rows()['Geocoded_City1'], rows()['Geocoded_City2'])
+            return routes.build_route_data(rows(), city_index)
+
+        # Read (or built and cached) on first use
+        cube = lambda: snapshot.cached_frame('cube', version, lambda: aggregates.build_cube(rows()))
+        route_data = lambda: snapshot.cached_frame('routes', version, build_route_data)
+        airlines = manifest.get('carriers') or [str(airline) for airline in pd.unique(df['carrier_full'].dropna())]
+        return cls(version, cube, route_data, airlines)
+
+    # New Dataset with `delta` rows added. Cost depends on the delta and on the size of the
+    # aggregates (carriers x quarters, distinct routes), never on the history behind them.
+    def fold(self, delta, delta_id):
+        delta = snapshot.apply_schema(delta)
+        cube = aggregates.merge_cubes(self.airline_cube, aggregates.build_cube(delta))
+        route_data = routes.merge_route_data(self.route_data, delta)
+
+        airlines = list(self.unique_airlines)
+        for airline in pd.unique(delta['carrier_full'].dropna()):
+            if str(airline) not in self.color_map:
+                airlines.append(str(airline))
+
+        version = hashlib.sha256(f'{self.version}+{delta_id}'.encode()).hexdigest()[:16]
+        return Dataset(version, cube, route_data, airlines, self.color_map)
+
+
+_current = None
+_load_lock = threading.Lock()
+
+
+# The published Dataset, opening the snapshot on first call
+def current():
+    if _current is None:
+        with _load_lock:
+            if _current is None:
+                load()
+    return _current
+
+
+# The published Dataset, or None if nothing has been loaded yet (never loads)
+def loaded():
+    return _current
+
+
+def publish(new_dataset):
+    global _current
+    _current = new_dataset
+
+
+def load():
+    df, manifest = snapshot.open_dataset()
+    publish(Dataset.from_snapshot(df, manifest))
+    return _current
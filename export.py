@@ -0,0 +1,267 @@
+import datetime
+import hashlib
+import html
+import json
+import os
+import re
+import shutil
+
+import flask
+
+# Static export of the default dashboard views.
+#
+# `python export.py` renders every section 1 tab (plus each tab5 year and the default
+# route map) and the section 2 tabs for a set of common airline selections, and writes
+# each callback response as JSON plus a standalone HTML page under
+#   <export dir>/<dataset version>/
+# with a manifest mapping every artifact to its figure cache key and content hash.
+#
+# install() makes the running app pin those responses in its figure cache, so the
+# default dashboard costs no computation per request, and serves the files at /export/
+# with ETags. The version directory is also a static site on its own (index.html); it
+# ships the plotly.js bundled with Dash, so it renders exactly like the app.
+
+EXPORT_DIR = os.environ.get(
+    'AIRLINE_EXPORT_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'export')
+)
+MANIFEST_NAME = 'manifest.json'
+PLOTLY_JS = 'plotly.min.js'
+
+SECTION1_TABS = ('tab1', 'tab2', 'tab3', 'tab4', 'tab5', 'tab6')
+SECTION2_TABS = ('tab7', 'tab8', 'tab9')
+
+
+def version_dir(version, export_dir=EXPORT_DIR):
+    return os.path.join(export_dir, version)
+
+
+def read_manifest(version, export_dir=EXPORT_DIR):
+    try:
+        with open(os.path.join(version_dir(version, export_dir), MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+# Cache keys are tuples; JSON turns them into lists
+def _key_from_json(value):
+    return tuple(_key_from_json(item) for item in value) if isinstance(value, list) else value
+
+
+def _slug(selection):
+    if not selection:
+        return 'all'
+    return '_'.join(re.sub(r'[^a-z0-9]+', '-', str(airline).lower()).strip('-') for airline in selection)
+
+
+def _etag(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+# ---- HTML rendering of serialized component trees ----
+
+# JSON that is safe inside a <script> element
+def _script_json(value):
+    return json.dumps(value).replace('</', '<\\/')
+
+
+def _figure_html(figure, figure_id):
+    figure = figure or {'data': [], 'layout': {}}
+    return (f'<div id="{figure_id}"></div>\n'
+            f'<script>Plotly.newPlot("{figure_id}", {_script_json(figure.get("data", []))}, '
+            f'{_script_json(figure.get("layout", {}))});</script>')
+
+
+def _component_html(node, figure_ids):
+    if isinstance(node, list):
+        return ''.join(_component_html(child, figure_ids) for child in node)
+    if isinstance(node, (str, int, float)):
+        return html.escape(str(node))
+    if not isinstance(node, dict) or 'type' not in node:
+        return ''
+
+    props = node.get('props', {})
+    if node['type'] == 'Graph':
+        figure_ids.append(f'figure-{len(figure_ids)}')
+        return _figure_html(props.get('figure'), figure_ids[-1])
+    if node.get('namespace') != 'dash_html_components':
+        return ''  # interactive controls have no static equivalent
+
+    tag = node['type'].lower()
+    attributes = ''
+    if tag == 'a' and props.get('href'):
+        attributes = f' href="{html.escape(props["href"])}"'
+    return f'<{tag}{attributes}>{_component_html(props.get("children"), figure_ids)}</{tag}>'
+
+
+def _page(title, version, body):
+    return (
+        '<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+        f'<title>{html.escape(title)}</title><script src="{PLOTLY_JS}"></script></head>\n'
+        f'<body><p><a href="index.html">All views</a> | dataset {version}</p>\n'
+        f'<h2>{html.escape(title)}</h2>\n{body}\n</body></html>\n'
+    )
+
+
+# ---- Export ----
+
+# (name, title, cache key, render) for every exported view
+def _views(app, selections):
+    ds = app.dataset.current()
+    views = [(f'section1/{tab}', f'Section 1 {tab}', ('section1', tab, ()),
+              lambda tab=tab: app.render_section1_content(tab)) for tab in SECTION1_TABS]
+    views += [(f'market-share/{year}', f'Quarterly market share {year}', ('market-share', 'tab5', year),
+               lambda year=year: app.render_market_share_year(year)) for year in ds.market_share_years]
+    # The tab6 controls' initial values
+    bounds = app.ROUTE_MAP_BOUNDS
+    views.append(('route-map/default', 'Top routes', ('route-map', 'tab6', (5, 0, None, None)),
+                  lambda: app.render_route_map(5, 0, None, list(bounds[:2]), list(bounds[2:]))))
+    for selection in selections:
+        selection = app.normalize_selection(selection)
+        for tab in SECTION2_TABS:
+            label = ', '.join(selection) if selection else 'all airlines'
+            views.append((f'section2/{tab}/{_slug(selection)}', f'Section 2 {tab} ({label})', ('section2', tab, selection),
+                          lambda tab=tab, selection=selection: app.render_section2_content(tab, list(selection))))
+    return views
+
+
+# Default section 2 selections: all airlines, each of the top 5 by market share, and the top 5 together
+def default_selections(ds):
+    top = [str(airline) for airline in ds.top_5_market_airlines]
+    return [None] + [[airline] for airline in top] + [top]
+
+
+def build(export_dir=EXPORT_DIR, selections=None):
+    import dash.dcc
+    import app
+
+    ds = app.dataset.current()
+    if selections is None:
+        selections = default_selections(ds)
+    # Render everything afresh rather than copying a previous export pinned at import. The
+    # warm-up pins that export too, so let it finish first or its pins land after the reset
+    app.warmup.wait()
+    app.figure_cache.invalidate()
+
+    target = version_dir(ds.version, export_dir)
+    tmp_dir = f'{target}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    artifacts = {}
+
+    def write(name, data, key=None):
+        path = os.path.join(tmp_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        artifacts[name] = {'etag': _etag(data), 'bytes': len(data)}
+        if key is not None:
+            artifacts[name]['key'] = key
+
+    with open(os.path.join(os.path.dirname(dash.dcc.__file__), PLOTLY_JS), 'rb') as f:
+        write(PLOTLY_JS, f.read())
+
+    links = []
+    for name, title, key, render in _views(app, selections):
+        value = render()
+        write(f'{name}.json', json.dumps(value, separators=(',', ':')).encode(), key)
+
+        # Pages sit at the top level so they share plotly.min.js and index.html
+        page = name.replace('/', '--') + '.html'
+        if isinstance(value, dict) and 'data' in value and 'layout' in value:
+            body = _figure_html(value, 'figure-0')
+        else:
+            body = _component_html(value, [])
+        write(page, _page(title, ds.version, body).encode())
+        links.append(f'<li><a href="{page}">{html.escape(title)}</a> (<a href="{name}.json">json</a>)</li>')
+
+    write('index.html', _page('Airline Market Visualization Dashboard', ds.version,
+                              '<ul>\n' + '\n'.join(links) + '\n</ul>').encode())
+
+    manifest = {
+        'dataset_version': ds.version,
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'selections': [list(app.normalize_selection(selection)) for selection in selections],
+        'artifacts': artifacts,
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp_dir, target)
+    return manifest
+
+
+# ---- Serving ----
+
+# Pin the exported callback responses for `version` into the figure cache; returns how many
+def pin(figure_cache, version, export_dir=EXPORT_DIR):
+    manifest = read_manifest(version, export_dir)
+    if manifest is None:
+        return 0
+    pinned = 0
+    for name, artifact in manifest['artifacts'].items():
+        if 'key' in artifact:
+            with open(os.path.join(version_dir(version, export_dir), name)) as f:
+                figure_cache.pin(_key_from_json(artifact['key']), version, json.load(f))
+            pinned += 1
+    return pinned
+
+
+# Serve the export of the current dataset version (current_version() -> str) at /export/.
+# A manifest is read again whenever it changes (a later `python export.py` run), and each
+# new one is pinned into `figure_cache`, if given
+def install(server, current_version, figure_cache=None, export_dir=EXPORT_DIR):
+    manifests = {}  # version -> (manifest mtime, manifest)
+
+    @server.route('/export/', defaults={'name': 'index.html'})
+    @server.route('/export/<path:name>')
+    def serve_export(name):
+        version = current_version()
+        try:
+            mtime = os.stat(os.path.join(version_dir(version, export_dir), MANIFEST_NAME)).st_mtime_ns
+        except FileNotFoundError:
+            flask.abort(404)  # not exported (yet); nothing is remembered
+        if manifests.get(version, (None,))[0] != mtime:
+            manifest = read_manifest(version, export_dir)
+            if manifest is None:
+                flask.abort(404)
+            manifests[version] = (mtime, manifest)
+            if figure_cache is not None:
+                pin(figure_cache, version, export_dir)
+        manifest = manifests[version][1]
+        artifact = manifest['artifacts'].get(name)
+        if artifact is None:
+            flask.abort(404)
+
+        # send_file answers If-None-Match with 304 when the ETag matches
+        response = flask.send_from_directory(version_dir(version, export_dir), name, etag=artifact['etag'])
+        response.cache_control.no_cache = True
+        return response
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pre-render the default dashboard views into static JSON/HTML.")
+    parser.add_argument('--output', default=EXPORT_DIR, help="Export directory (one subdirectory per dataset version)")
+    parser.add_argument('--selection', action='append', default=None,
+                        help="Comma-separated airlines for a section 2 selection (repeatable; 'all' for no filter)")
+    parser.add_argument('--selections-file', help="JSON list of airline lists to export for section 2")
+    args = parser.parse_args()
+
+    selections = None
+    if args.selections_file:
+        with open(args.selections_file) as f:
+            selections = json.load(f)
+    if args.selection:
+        selections = (selections or []) + [
+            None if value == 'all' else [airline.strip() for airline in value.split(',')] for value in args.selection
+        ]
+
+    manifest = build(args.output, selections)
+    total = sum(artifact['bytes'] for artifact in manifest['artifacts'].values())
+    print(f"Exported {len(manifest['artifacts'])} files ({total:,} bytes) for dataset "
+          f"{manifest['dataset_version']} to {version_dir(manifest['dataset_version'], args.output)}")
@@ -0,0 +1,138 @@
+import json
+import threading
+from collections import OrderedDict
+
+import plotly
+
+import metrics
+
+# Bounded LRU cache for callback responses.
+#
+# Entries are keyed by (callback, tab, normalized airline selection) and hold the
+# component tree already serialized to plain JSON data, so a repeat view is a dict
+# lookup and Dash only has to re-encode plain lists/dicts. The whole cache is
+# dropped whenever the dataset version it was filled from changes. It only moves
+# forward: a callback still holding a version the cache has left (it read
+# dataset.current() just before a refresh) gets its figure built but neither reads
+# nor stores entries, so it can't switch the cache back.
+#
+# Pinned entries (pre-rendered by export.py) are served the same way but are never
+# evicted by the LRU bound.
+
+
+def normalize_selection(selected_airlines):
+    return tuple(sorted(set(selected_airlines))) if selected_airlines else ()
+
+
+def serialize_component(component):
+    return json.loads(json.dumps(component, cls=plotly.utils.PlotlyJSONEncoder))
+
+
+class FigureCache:
+    # transform(serialized) runs once per miss on the serialized tree, before it is stored
+    def __init__(self, maxsize=256, transform=None):
+        self.maxsize = maxsize
+        self.transform = transform
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.version = None
+        self._entries = OrderedDict()
+        self._pinned = {}
+        self._retired = set()
+        self._lock = threading.Lock()
+
+    def invalidate(self, version=None):
+        with self._lock:
+            self._entries.clear()
+            self._pinned.clear()
+            self.version = version
+
+    # Whether entries for `version` may be used, switching to it if it is new
+    def _accept(self, version):
+        if version == self.version:
+            return True
+        if version in self._retired:
+            return False
+        if self.version is not None:
+            self._retired.add(self.version)
+        self._entries.clear()
+        self._pinned.clear()
+        self.version = version
+        return True
+
+    # `value` must already be serialized and transformed, like a stored entry
+    def pin(self, key, version, value):
+        with self._lock:
+            if self._accept(version):
+                self._pinned[key] = value
+
+    # The stored or pinned value for `key`, or None. Only a hit is counted: the caller
+    # builds a missing value some other way (see app.register_expensive)
+    def peek(self, key, version):
+        with self._lock:
+            if not self._accept(version):
+                return None
+            if key in self._pinned:
+                value = self._pinned[key]
+            elif key in self._entries:
+                self._entries.move_to_end(key)
+                value = self._entries[key]
+            else:
+                return None
+            self.hits += 1
+            metrics.note_cache('hit')
+            return value
+
+    # Store a value built elsewhere; like pin(), it must already be serialized and transformed
+    def put(self, key, version, value):
+        with self._lock:
+            if self._accept(version):
+                self._store(key, value)
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_build(self, key, version, build):
+        with self._lock:
+            current = self._accept(version)
+            if current and key in self._pinned:
+                self.hits += 1
+                metrics.note_cache('hit')
+                return self._pinned[key]
+            if current and key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.note_cache('hit')
+                return self._entries[key]
+            self.misses += 1
+        metrics.note_cache('miss')
+
+        # Build outside the lock so a slow figure doesn't block other lookups
+        with metrics.phase('figure'):
+            component = build()
+        with metrics.phase('serialize'):
+            value = serialize_component(component)
+            if self.transform is not None:
+                value = self.transform(value)
+
+        with self._lock:
+            if version == self.version:
+                self._store(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'pinned': len(self._pinned),
+                'maxsize': self.maxsize,
+                'version': self.version,
+            }
@@ -0,0 +1,51 @@
+import gc
+import logging
+
+import refresh
+import warmup
+
+# Gunicorn settings for `gunicorn app:server`.
+#
+# The app module is imported once in the master (preload_app) and then forked, so
+# every worker attaches to the same memory-mapped snapshot and aggregate column files
+# and shares the rest of the preloaded objects copy-on-write. Adding workers adds
+# per-worker interpreter overhead, not another copy of the dataset.
+
+preload_app = True
+
+# The app's own loggers, forwarded to gunicorn's error log at its log level
+APP_LOGGERS = ('refresh', 'warmup')
+
+
+class GunicornErrorLog(logging.Handler):
+    def emit(self, record):
+        error_log = logging.getLogger('gunicorn.error')
+        if error_log.isEnabledFor(record.levelno):
+            error_log.handle(record)
+
+
+# Attached when gunicorn loads this file, before the app is imported, so nothing logged
+# during the preload import is lost
+for name in APP_LOGGERS:
+    app_logger = logging.getLogger(name)
+    app_logger.addHandler(GunicornErrorLog())
+    app_logger.setLevel(logging.DEBUG)
+    app_logger.propagate = False
+
+
+def when_ready(server):
+    # Let the startup thread pool (warmup.py) finish in the master before any worker is
+    # forked: the views are then built once and shared, and no thread is mid-build at fork.
+    # On a first boot this is also where the snapshot is ingested (dataset.current() does
+    # it once, under its load lock).
+    warmup.wait()
+    # Everything built during the preload import lives for the whole process. Freezing it
+    # keeps the cyclic GC in the workers from writing to those pages and un-sharing them.
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # The refresh thread (AIRLINE_REFRESH_INTERVAL) can't be started in the master: threads
+    # don't survive the fork. Each worker polls and folds new rows into its own copy.
+    refresh.start_from_env()
@@ -0,0 +1,239 @@
+import cProfile
+import functools
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import flask
+
+# In-process metrics for the Dash callbacks, rendered in the Prometheus text format.
+#
+# `instrument` wraps a callback and records its wall time split into phases
+# (aggregate / figure / serialize, see `phase`), the active tab, the airline selection
+# size and whether the figure cache answered it. `install` registers /metrics on the
+# Flask server and adds per-request response size/latency for _dash-update-component.
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50)
+
+PROFILING_ENABLED = os.environ.get('AIRLINE_PROFILING', '0') == '1'
+PROFILE_DIR = os.environ.get('AIRLINE_PROFILE_DIR', tempfile.gettempdir())
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._gauges = {}
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def inc(self, name, labels=(), value=1):
+        with self._lock:
+            self._counters[(name, tuple(labels))] += value
+
+    def observe(self, name, labels, value, buckets=SECONDS_BUCKETS):
+        with self._lock:
+            key = (name, tuple(labels))
+            if key not in self._histograms:
+                self._histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            histogram = self._histograms[key]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['counts'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    # Gauges are read when /metrics is scraped: fn() -> {labels tuple: value}
+    def gauge(self, name, fn):
+        self._gauges[name] = fn
+
+    def render(self):
+        lines = []
+        emitted = set()
+
+        def header(name, kind):
+            if name not in emitted:
+                emitted.add(name)
+                text = self._help.get(name, (kind, name))[1]
+                lines.append(f'# HELP {name} {text}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+            histograms = [(key, dict(h, counts=list(h['counts']))) for key, h in histograms]
+
+        for (name, labels), value in counters:
+            header(name, 'counter')
+            lines.append(f'{name}{_labels(labels)} {value:g}')
+
+        for (name, labels), histogram in histograms:
+            header(name, 'histogram')
+            for bound, count in zip(histogram['buckets'], histogram['counts']):
+                lines.append(f'{name}_bucket{_labels(labels + (("le", f"{bound:g}"),))} {count}')
+            lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {histogram["count"]}')
+            lines.append(f'{name}_sum{_labels(labels)} {histogram["sum"]:g}')
+            lines.append(f'{name}_count{_labels(labels)} {histogram["count"]}')
+
+        for name, fn in sorted(self._gauges.items()):
+            header(name, 'gauge')
+            for labels, value in sorted(fn().items()):
+                lines.append(f'{name}{_labels(labels)} {value:g}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+registry = Registry()
+registry.describe('airline_callback_seconds', 'histogram', "Callback wall time by phase (aggregate, figure, serialize, other, total).")
+registry.describe('airline_callback_calls_total', 'counter', "Callback invocations by callback, tab and figure cache result.")
+registry.describe('airline_callback_selection_size', 'histogram', "Number of airlines selected per callback invocation.")
+registry.describe('airline_callback_errors_total', 'counter', "Callbacks that raised.")
+registry.describe('airline_response_bytes', 'histogram', "Size of _dash-update-component responses.")
+registry.describe('airline_request_seconds', 'histogram', "End-to-end _dash-update-component request time, including Dash's JSON encoding.")
+
+_current = threading.local()
+_armed_profiles = set()
+_armed_lock = threading.Lock()
+
+
+# Time a block and charge it to `name` in the current callback. Nested phases are
+# exclusive: time spent in an inner phase is not also counted in the outer one.
+@contextmanager
+def phase(name):
+    record = getattr(_current, 'record', None)
+    if record is None:
+        yield
+        return
+
+    stack = record['stack']
+    start = time.perf_counter()
+    stack.append(0.0)
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        nested = stack.pop()
+        record['phases'][name] += elapsed - nested
+        if stack:
+            stack[-1] += elapsed
+
+
+# Mark the figure cache result ('hit' or 'miss') for the current callback
+def note_cache(result):
+    record = getattr(_current, 'record', None)
+    if record is not None:
+        record['cache'] = result
+
+
+# tab_arg/selection_arg are positional indexes of the tab value and the airline list;
+# callbacks bound to a single tab pass it as `tab` instead. The tab value comes from the
+# client, so anything outside `tabs` is labelled 'other' (every label value is a new series)
+def instrument(callback_name, tab_arg=None, selection_arg=None, tab='', tabs=()):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            active_tab = args[tab_arg] if tab_arg is not None and len(args) > tab_arg else tab
+            if tab_arg is not None and active_tab not in tabs:
+                active_tab = 'other'
+            selection = args[selection_arg] if selection_arg is not None and len(args) > selection_arg else None
+
+            record = {'phases': defaultdict(float), 'stack': [], 'cache': 'none'}
+            _current.record = record
+            if flask.has_request_context():
+                flask.g.airline_callback = callback_name
+
+            start = time.perf_counter()
+            try:
+                if _take_profile(callback_name):
+                    result = _profiled(callback_name, fn, args, kwargs)
+                else:
+                    result = fn(*args, **kwargs)
+            except Exception:
+                registry.inc('airline_callback_errors_total', (('callback', callback_name),))
+                raise
+            finally:
+                _current.record = None
+            total = time.perf_counter() - start
+
+            labels = (('callback', callback_name), ('tab', active_tab))
+            phases = record['phases']
+            phases['other'] = max(total - sum(phases.values()), 0.0)
+            phases['total'] = total
+            for name, seconds in phases.items():
+                registry.observe('airline_callback_seconds', labels + (('phase', name),), seconds)
+            registry.inc('airline_callback_calls_total', labels + (('cache', record['cache']),))
+            if selection_arg is not None:
+                registry.observe('airline_callback_selection_size', (('callback', callback_name),),
+                                 len(selection) if selection else 0, COUNT_BUCKETS)
+            return result
+        return wrapper
+    return decorator
+
+
+# ---- One-shot cProfile dumps (AIRLINE_PROFILING=1) ----
+
+def _take_profile(callback_name):
+    if not _armed_profiles:
+        return False
+    with _armed_lock:
+        if callback_name in _armed_profiles:
+            _armed_profiles.discard(callback_name)
+            return True
+    return False
+
+
+def _profiled(callback_name, fn, args, kwargs):
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(fn, *args, **kwargs)
+    finally:
+        path = os.path.join(PROFILE_DIR, f'{callback_name}-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}.prof')
+        profiler.dump_stats(path)
+
+
+def install(server):
+    @server.route('/metrics')
+    def serve_metrics():
+        return flask.Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    @server.before_request
+    def start_request_timer():
+        if flask.request.path.endswith('_dash-update-component'):
+            flask.g.airline_request_start = time.perf_counter()
+
+    @server.after_request
+    def record_response(response):
+        start = flask.g.get('airline_request_start')
+        if start is not None:
+            labels = (('callback', flask.g.get('airline_callback', 'unknown')),)
+            registry.observe('airline_request_seconds', labels, time.perf_counter() - start)
+            size = response.calculate_content_length()
+            if size is not None:
+                registry.observe('airline_response_bytes', labels, size, BYTES_BUCKETS)
+        return response
+
+    if PROFILING_ENABLED:
+        # Arm a cProfile dump of the next invocation of one callback
+        @server.route('/debug/profile/<callback_name>', methods=['POST', 'GET'])
+        def arm_profile(callback_name):
+            with _armed_lock:
+                _armed_profiles.add(callback_name)
+            return flask.jsonify({'armed': callback_name, 'profile_dir': PROFILE_DIR})
@@ -0,0 +1,181 @@
+import base64
+import gzip
+import os
+import re
+
+import flask
+import numpy as np
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is used when brotli isn't installed
+    brotli = None
+
+# Smaller figure payloads and compressed responses.
+#
+# minimize_tree() rewrites every figure inside an already-serialized component tree
+# (see figure_cache.serialize_component):
+#   - numeric arrays are rounded to AIRLINE_PAYLOAD_PRECISION significant digits, and
+#     integral arrays are sent as integers;
+#   - when the bundled plotly.js understands typed arrays (>= 2.28), numeric arrays are
+#     sent as base64 {'dtype', 'bdata'} buffers instead of JSON lists; with an older
+#     plotly.js any typed arrays plotly.py produced are expanded back into plain lists;
+#   - per-point `text`/`hovertext` arrays whose entries are all equal become one scalar.
+# install() gzip/brotli-compresses the Dash layout and callback responses.
+
+PRECISION = int(os.environ.get('AIRLINE_PAYLOAD_PRECISION', 6))
+COMPRESS_MIN_BYTES = int(os.environ.get('AIRLINE_COMPRESS_MIN_BYTES', 1024))
+COMPRESS_LEVEL = int(os.environ.get('AIRLINE_COMPRESS_LEVEL', 6))
+
+NUMERIC_KEYS = ('x', 'y', 'z', 'lat', 'lon')
+TEXT_KEYS = ('text', 'hovertext')
+COMPRESSED_PATHS = ('/_dash-update-component', '/_dash-layout', '/_dash-dependencies')
+
+
+def _plotly_js_version():
+    try:
+        import dash.dcc
+        path = os.path.join(os.path.dirname(dash.dcc.__file__), 'plotly.min.js')
+        with open(path) as f:
+            match = re.search(r'plotly\.js v(\d+)\.(\d+)', f.read(512))
+    except (ImportError, OSError):
+        return None
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def _typed_arrays_supported():
+    setting = os.environ.get('AIRLINE_TYPED_ARRAYS', 'auto')
+    if setting != 'auto':
+        return setting == '1'
+    version = _plotly_js_version()
+    return version is not None and version >= (2, 28)
+
+
+TYPED_ARRAYS = _typed_arrays_supported()
+
+
+def _decode(value):
+    if isinstance(value, dict) and 'bdata' in value and 'dtype' in value:
+        array = np.frombuffer(base64.b64decode(value['bdata']), dtype=value['dtype'])
+        shape = value.get('shape')
+        if isinstance(shape, str):
+            shape = [int(dim) for dim in shape.split(',')]
+        return array.reshape(shape) if shape else array
+    return value
+
+
+# Numeric array -> float64 ndarray, or None if the value isn't a purely numeric array
+def _as_numeric(value):
+    value = _decode(value)
+    if isinstance(value, np.ndarray):
+        return value.astype('float64') if value.dtype.kind in 'biuf' else None
+    if not isinstance(value, list) or not value:
+        return None
+    if not all(item is None or (isinstance(item, (int, float)) and not isinstance(item, bool)) for item in value):
+        return None
+    return np.array([np.nan if item is None else item for item in value], dtype='float64')
+
+
+# Round each element to `digits` significant digits; formatting yields the shortest float
+# that prints that way, so the JSON text carries no rounding noise
+def _round_significant(values, digits):
+    return np.array([float(f'{value:.{digits}g}') for value in values.tolist()], dtype='float64')
+
+
+def _typed(values, dtype):
+    data = values.astype(dtype)
+    return {'dtype': data.dtype.str.lstrip('<|'), 'bdata': base64.b64encode(data.tobytes()).decode('ascii')}
+
+
+def _encode(values):
+    finite = np.isfinite(values)
+    integral = finite.all() and np.array_equal(values, np.round(values))
+    if integral:
+        low, high = (values.min(), values.max()) if values.size else (0, 0)
+        for dtype in ('int8', 'int16', 'int32'):
+            if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+                break
+        else:
+            dtype = 'float64'
+        if TYPED_ARRAYS:
+            return _typed(values, dtype)
+        return values.astype('int64').tolist()
+
+    values = _round_significant(values, PRECISION)
+    if TYPED_ARRAYS:
+        # float32 holds ~7 significant digits, enough for the default precision
+        return _typed(values, 'float32' if PRECISION <= 7 else 'float64')
+    return [None if not ok else value for ok, value in zip(finite, values.tolist())]
+
+
+def minimize_trace(trace):
+    for key in NUMERIC_KEYS:
+        if key in trace:
+            values = _as_numeric(trace[key])
+            if values is not None and values.ndim == 1:
+                trace[key] = _encode(values)
+
+    for key in TEXT_KEYS:
+        text = trace.get(key)
+        if isinstance(text, list) and text and all(item == text[0] for item in text):
+            trace[key] = text[0]
+    return trace
+
+
+def minimize_figure(figure):
+    for trace in figure.get('data', []):
+        if isinstance(trace, dict):
+            minimize_trace(trace)
+    return figure
+
+
+# Minimize every figure found in a serialized component tree (in place)
+def minimize_tree(node):
+    if isinstance(node, dict):
+        if isinstance(node.get('data'), list) and 'layout' in node:
+            minimize_figure(node)
+        for value in node.values():
+            if isinstance(value, (dict, list)):
+                minimize_tree(value)
+    elif isinstance(node, list):
+        for value in node:
+            if isinstance(value, (dict, list)):
+                minimize_tree(value)
+    return node
+
+
+def _accepted_encoding(accept_encoding):
+    accept_encoding = accept_encoding.lower()
+    if brotli is not None and 'br' in accept_encoding:
+        return 'br'
+    if 'gzip' in accept_encoding:
+        return 'gzip'
+    return None
+
+
+def install(server):
+    @server.after_request
+    def compress_response(response):
+        path = flask.request.path
+        if not (path == '/' or path.endswith(COMPRESSED_PATHS)):
+            return response
+        if response.direct_passthrough or response.status_code != 200 or 'Content-Encoding' in response.headers:
+            return response
+
+        encoding = _accepted_encoding(flask.request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        body = response.get_data()
+        if len(body) < COMPRESS_MIN_BYTES:
+            return response
+
+        if encoding == 'br':
+            body = brotli.compress(body, quality=min(COMPRESS_LEVEL, 11))
+        else:
+            body = gzip.compress(body, compresslevel=min(COMPRESS_LEVEL, 9))
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        response.headers['Content-Length'] = str(len(body))
+        response.vary.add('Accept-Encoding')
+        return response
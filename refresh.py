@@ -0,0 +1,290 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # missing on Windows; every process then checks the source itself
+    fcntl = None
+
+import dataset
+import snapshot
+
+# Incremental refresh of the running app.
+#
+# A Refresher polls for new rows and folds only those rows into the current Dataset's
+# aggregates (see Dataset.fold), then publishes the result. Callbacks pick the new
+# version up on their next call and the figure cache drops entries for the old one;
+# nothing is re-read from the snapshot and the process is never restarted.
+#
+# New rows come from one of two places:
+#   - AIRLINE_INCREMENT_DIR: rows of every *.csv in this directory are folded in once.
+#     Files are append-only: each file's folded length is tracked, so rows appended
+#     later are folded on a later poll. A file whose folded part changed is reported
+#     and not folded again (that would count its rows twice);
+#   - otherwise the source itself. One process (whichever holds the lock in the spool
+#     directory) checks it: a stat for a local file, a conditional ranged GET for a URL,
+#     starting just before the bytes already consumed. Only the appended bytes are
+#     parsed; their rows are written as a new CSV into
+#     <snapshot version>/increments/, which every process then folds like an increment
+#     directory. If the bytes before the offset no longer match (the source was
+#     rewritten), the whole source is read once and only rows past the current
+#     watermark are kept.
+#
+# AIRLINE_REFRESH_INTERVAL (seconds, 0 = off) enables the background thread. It logs to the
+# `refresh` logger, which gunicorn.conf.py sends to gunicorn's error log.
+
+REFRESH_INTERVAL = float(os.environ.get('AIRLINE_REFRESH_INTERVAL', 0))
+INCREMENT_DIR = os.environ.get('AIRLINE_INCREMENT_DIR')
+CHUNK_ROWS = int(os.environ.get('AIRLINE_REFRESH_CHUNK_ROWS', 200_000))
+
+SPOOL_NAME = 'increments'
+SOURCE_STATE_NAME = 'source.json'
+LEADER_LOCK_NAME = 'leader.lock'
+
+logger = logging.getLogger(__name__)
+
+USECOLS = list(snapshot.SCHEMA)
+
+
+# Rows of a CSV (bytes) past `watermark`, read in chunks so only the delta is kept in memory
+def read_rows(data, watermark=None):
+    chunks = []
+    for chunk in pd.read_csv(io.BytesIO(data), usecols=lambda name: name in USECOLS, chunksize=CHUNK_ROWS):
+        if watermark is not None:
+            year, quarter = watermark
+            chunk = chunk[(chunk['Year'] > year) | ((chunk['Year'] == year) & (chunk['quarter'] > quarter))]
+        if not chunk.empty:
+            chunks.append(chunk)
+    return pd.concat(chunks, ignore_index=True) if chunks else None
+
+
+def _tail_hash(data):
+    return snapshot.content_hash(data[-snapshot.TAIL_CHECK_BYTES:])
+
+
+# (position of data[0], data) from byte `start` to the end of the source, or None if it is
+# unchanged since the validators in `state` were recorded
+def _fetch_from(source, start, state):
+    if not source.startswith(('http://', 'https://')):
+        stat = os.stat(source)
+        if [stat.st_size, stat.st_mtime_ns] == state.get('stat'):
+            return None
+        state['stat'] = [stat.st_size, stat.st_mtime_ns]
+        with open(source, 'rb') as f:
+            f.seek(min(start, stat.st_size))
+            return f.tell(), f.read()
+
+    headers = {'Range': f'bytes={start}-'}
+    if state.get('etag'):
+        headers['If-None-Match'] = state['etag']
+    if state.get('last_modified'):
+        headers['If-Modified-Since'] = state['last_modified']
+    try:
+        with urllib.request.urlopen(urllib.request.Request(source, headers=headers)) as response:
+            state['etag'] = response.headers.get('ETag')
+            state['last_modified'] = response.headers.get('Last-Modified')
+            # 200: the server ignored the range and sent everything
+            return (start if response.status == 206 else 0), response.read()
+    except urllib.error.HTTPError as error:
+        if error.code == 304:
+            return None
+        if error.code == 416:  # shorter than `start`: rewritten
+            return 0, snapshot.read_source_bytes(source)
+        raise
+
+
+class Refresher:
+    def __init__(self, interval=REFRESH_INTERVAL, increment_dir=INCREMENT_DIR, source=snapshot.SOURCE_URL,
+                 snapshot_dir=snapshot.SNAPSHOT_DIR):
+        self.interval = interval
+        self.source = None
+        self.increment_dir = increment_dir
+        if increment_dir is None:
+            version_dir = snapshot.current_version_dir(snapshot_dir)
+            self.source = source
+            self.increment_dir = os.path.join(version_dir, SPOOL_NAME)
+            self.manifest = snapshot.read_manifest(snapshot_dir)
+        self.seen_files = {}
+        self._lock_file = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---- Increment files ----
+
+    # New complete lines of one increment file as CSV bytes (with its header), or None.
+    # seen_files maps a name to (folded length, hash of those bytes)
+    def _appended(self, name, data):
+        end = data.rfind(b'\n') + 1  # a line still being written waits for the next poll
+        header_end = data.find(b'\n') + 1
+        if header_end == 0:
+            return None
+        offset, sha256 = self.seen_files.get(name, (header_end, snapshot.content_hash(data[:header_end])))
+        if end < offset or snapshot.content_hash(data[:offset]) != sha256:
+            logger.warning("Increment file %s was rewritten; only rows appended from now on will be folded in", name)
+            self.seen_files[name] = (end, snapshot.content_hash(data[:end]))
+            return None
+        if end == offset:
+            return None
+        self.seen_files[name] = (end, snapshot.content_hash(data[:end]))
+        return data[:header_end] + data[offset:end]
+
+    # (delta frame, delta id) of the rows not yet folded in, or (None, None)
+    def _pending_files(self):
+        try:
+            names = sorted(name for name in os.listdir(self.increment_dir) if name.endswith('.csv'))
+        except FileNotFoundError:
+            return None, None
+
+        frames, ids = [], []
+        for name in names:
+            path = os.path.join(self.increment_dir, name)
+            offset = self.seen_files.get(name, (0, None))[0]
+            if os.path.getsize(path) == offset:
+                continue  # nothing appended since the last fold
+            with open(path, 'rb') as f:
+                data = f.read()
+            appended = self._appended(name, data)
+            if appended is None:
+                continue
+            frame = read_rows(appended)
+            if frame is not None:
+                frames.append(frame)
+                ids.append(f'{name}:{offset}:{snapshot.content_hash(appended)}')
+        if not frames:
+            return None, None
+        return pd.concat(frames, ignore_index=True), ','.join(ids)
+
+    # ---- Source checks (one process) ----
+
+    # Whether this process checks the source; the lock is held until the process exits
+    def _is_leader(self):
+        if self._lock_file is not None or fcntl is None:
+            return True
+        os.makedirs(self.increment_dir, exist_ok=True)
+        lock_file = open(os.path.join(self.increment_dir, LEADER_LOCK_NAME), 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    # Where the last check stopped; starts from the snapshot's manifest
+    def _source_state(self):
+        try:
+            with open(os.path.join(self.increment_dir, SOURCE_STATE_NAME)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            manifest = self.manifest or {}
+            return {'offset': manifest.get('source_bytes'), 'tail_sha256': manifest.get('source_tail_sha256')}
+
+    def _save_source_state(self, state):
+        path = os.path.join(self.increment_dir, SOURCE_STATE_NAME)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(f'{path}.tmp', path)
+
+    # New rows of the source, or None; updates `state`. `watermark` only applies to a rewrite
+    def _source_rows(self, state, watermark):
+        offset, tail_sha256 = state.get('offset'), state.get('tail_sha256')
+        if offset and state.get('header') is None:
+            with snapshot.open_source(self.source) as stream:
+                state['header'] = stream.readline().decode()
+        start = max(offset - snapshot.TAIL_CHECK_BYTES, 0) if offset and tail_sha256 else 0
+        fetched = _fetch_from(self.source, start, state)
+        if fetched is None:
+            return None
+        base, data = fetched
+
+        appended = offset is not None and tail_sha256 is not None and base <= start
+        if appended:
+            # The bytes before the offset must be the ones already consumed
+            appended = (offset - base <= len(data)
+                        and _tail_hash(data[start - base:offset - base]) == tail_sha256)
+        if appended:
+            new = data[offset - base:]
+            end = new.rfind(b'\n') + 1  # a line still being written waits for the next check
+            # Appended bytes are new rows whatever their period, so no watermark here
+            rows = read_rows(state['header'].encode() + new[:end]) if end else None
+            consumed = data[:offset - base + end]
+            state['offset'] = offset + end
+        else:
+            if base != 0:
+                base, data = 0, snapshot.read_source_bytes(self.source)
+            logger.warning("Source %s was rewritten; reading it again past watermark %s", self.source, watermark)
+            end = data.rfind(b'\n') + 1
+            rows = read_rows(data[:end], watermark)
+            consumed = data[:end]
+            state['offset'] = end
+            state['header'] = data[:data.find(b'\n') + 1].decode()
+        state['tail_sha256'] = _tail_hash(consumed)
+        return rows
+
+    # Check the source and write its new rows to the spool; returns whether it wrote any
+    def _spool_source(self, current):
+        state = self._source_state()
+        rows = self._source_rows(state, current.watermark)
+        written = False
+        if rows is not None and not rows.empty:
+            name = f'{len([n for n in os.listdir(self.increment_dir) if n.endswith(".csv")]):08d}.csv'
+            path = os.path.join(self.increment_dir, name)
+            rows.to_csv(f'{path}.tmp', index=False)
+            os.replace(f'{path}.tmp', path)
+            written = True
+        self._save_source_state(state)
+        return written
+
+    # ---- Polling ----
+
+    def _fold_pending(self):
+        delta, delta_id = self._pending_files()
+        if delta is None:
+            return None
+        refreshed = dataset.current().fold(delta, hashlib.sha256(delta_id.encode()).hexdigest())
+        # Build the new version's views here, so no request pays for them after the swap
+        dataset.publish(refreshed.derive_all())
+        return refreshed
+
+    # Fold any new rows into the current Dataset; returns the published Dataset or None
+    def poll(self):
+        # Fold what is already spooled first, so the watermark covers it before the source is read
+        refreshed = self._fold_pending()
+        if self.source is not None and self._is_leader():
+            if self._spool_source(dataset.current()):
+                refreshed = self._fold_pending() or refreshed
+        return refreshed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                refreshed = self.poll()
+            except Exception:  # keep serving the current version; try again next interval
+                logger.exception("Refresh failed")
+                continue
+            if refreshed is not None:
+                logger.info("Refreshed dataset to version %s", refreshed.version)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='airline-refresh', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+# Start the background refresher if AIRLINE_REFRESH_INTERVAL is set (threads don't survive
+# a fork, so under gunicorn this runs in each worker, see gunicorn.conf.py)
+def start_from_env():
+    if REFRESH_INTERVAL > 0:
+        return Refresher().start()
+    return None
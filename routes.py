@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+
+# Route tables and the city coordinate index behind the Geographic Route Map.
+#
+# Geocoded_City* values look like "(lat, lon)". Each distinct string is parsed once
+# into float32 arrays held by CityIndex; route tables then carry integer codes into
+# that index instead of re-parsing a string per route.
+
+
+# Vectorized "(lat, lon)" parser; unparseable values become NaN
+def parse_lat_lon(geo_strings):
+    parts = pd.Series(geo_strings, dtype=object).str.strip("()").str.split(",", expand=True)
+    if parts.shape[1] < 2:
+        nan = np.full(len(parts), np.nan, dtype=np.float32)
+        return nan, nan.copy()
+
+    lat = pd.to_numeric(parts[0], errors='coerce').to_numpy(np.float32)
+    lon = pd.to_numeric(parts[1], errors='coerce').to_numpy(np.float32)
+    if parts.shape[1] > 2:
+        # More than one comma is malformed, like a failed float() in the old per-row parser
+        malformed = parts.iloc[:, 2:].notna().any(axis=1).to_numpy()
+        lat[malformed] = np.nan
+        lon[malformed] = np.nan
+    return lat, lon
+
+
+class CityIndex:
+    # Deduplicated geocode string -> (lat, lon). Code -1 (missing/unknown) maps to the
+    # trailing NaN slot, so lat[codes] never needs a separate mask.
+    def __init__(self, geocodes):
+        self.geocodes = pd.Index(pd.unique(np.asarray(geocodes, dtype=object)), dtype=object).dropna()
+        lat, lon = parse_lat_lon(self.geocodes)
+        self.lat = np.append(lat, np.float32(np.nan))
+        self.lon = np.append(lon, np.float32(np.nan))
+
+    @classmethod
+    def from_columns(cls, *columns):
+        values = []
+        for column in columns:
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                values.append(np.asarray(column.cat.categories, dtype=object))
+            else:
+                values.append(pd.unique(column.to_numpy(dtype=object)))
+        return cls(np.concatenate(values) if values else [])
+
+    def __len__(self):
+        return len(self.geocodes)
+
+    def codes(self, values):
+        # Categoricals are resolved through their (small) categories rather than per row
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            category_codes = self.geocodes.get_indexer(values.cat.categories)
+            category_codes = np.append(category_codes, -1)
+            return category_codes[values.cat.codes.to_numpy()].astype(np.int32)
+        return self.geocodes.get_indexer(values).astype(np.int32)
+
+
+ROUTE_KEYS = ['city1', 'city2', 'Geocoded_City1', 'Geocoded_City2']
+
+
+# Total passengers per city pair with coordinates joined from the city index
+def build_route_data(df, city_index):
+    return join_coordinates(route_totals(df), city_index)
+
+
+# Passengers per city pair (no coordinates yet)
+def route_totals(df):
+    return df.groupby(ROUTE_KEYS, observed=True)['passengers'].sum().reset_index()
+
+
+# Add two route_totals() tables; only distinct routes are touched, never the rows behind them
+def add_route_totals(totals, more):
+    merged = pd.concat([totals[ROUTE_KEYS + ['passengers']], more[ROUTE_KEYS + ['passengers']]], ignore_index=True)
+    for column in ROUTE_KEYS:
+        merged[column] = merged[column].astype(object)
+    merged = merged.groupby(ROUTE_KEYS, sort=False)['passengers'].sum().reset_index()
+    for column in ROUTE_KEYS:
+        merged[column] = merged[column].astype('category')
+    return merged
+
+
+# Fold newly arrived rows into an existing route table
+def merge_route_data(route_data, delta):
+    merged = add_route_totals(route_data, route_totals(delta))
+    city_index = CityIndex.from_columns(merged['Geocoded_City1'], merged['Geocoded_City2'])
+    return join_coordinates(merged, city_index)
+
+
+def join_coordinates(route_data, city_index):
+    route_data['city1_code'] = city_index.codes(route_data['Geocoded_City1'])
+    route_data['city2_code'] = city_index.codes(route_data['Geocoded_City2'])
+    route_data['lat1'] = city_index.lat[route_data['city1_code'].to_numpy()]
+    route_data['lon1'] = city_index.lon[route_data['city1_code'].to_numpy()]
+    route_data['lat2'] = city_index.lat[route_data['city2_code'].to_numpy()]
+    route_data['lon2'] = city_index.lon[route_data['city2_code'].to_numpy()]
+    return route_data.dropna(subset=['lat1', 'lon1', 'lat2', 'lon2']).reset_index(drop=True)
+
+
+class RouteRanking:
+    # route_data sorted once by passengers (descending). Top-N is a slice and a minimum
+    # passenger threshold is a binary search, so changing either never re-sorts route_data.
+    def __init__(self, route_data):
+        self.routes = route_data.sort_values('passengers', ascending=False, kind='stable').reset_index(drop=True)
+        self.passengers = self.routes['passengers'].to_numpy()
+        self.origins = self.routes['city1'].astype(object).to_numpy()
+        self.lat1 = self.routes['lat1'].to_numpy()
+        self.lon1 = self.routes['lon1'].to_numpy()
+        self.lat2 = self.routes['lat2'].to_numpy()
+        self.lon2 = self.routes['lon2'].to_numpy()
+
+    def __len__(self):
+        return len(self.routes)
+
+    def top(self, n):
+        return self.routes.iloc[:n]
+
+    # Positions (in ranking order) of the routes matching the filters, capped at n.
+    # bbox = (lat_min, lat_max, lon_min, lon_max); a route matches if either end is inside it.
+    def select(self, n=None, min_passengers=None, origin=None, bbox=None):
+        end = len(self.routes)
+        if min_passengers:
+            end = int(np.searchsorted(-self.passengers, -min_passengers, side='right'))
+
+        if origin is None and bbox is None:
+            return np.arange(end if n is None else min(n, end))
+
+        mask = np.ones(end, dtype=bool)
+        if origin is not None:
+            mask &= self.origins[:end] == origin
+        if bbox is not None:
+            lat_min, lat_max, lon_min, lon_max = bbox
+            inside1 = (self.lat1[:end] >= lat_min) & (self.lat1[:end] <= lat_max) & (self.lon1[:end] >= lon_min) & (self.lon1[:end] <= lon_max)
+            inside2 = (self.lat2[:end] >= lat_min) & (self.lat2[:end] <= lat_max) & (self.lon2[:end] >= lon_min) & (self.lon2[:end] <= lon_max)
+            mask &= inside1 | inside2
+        positions = np.flatnonzero(mask)
+        return positions if n is None else positions[:n]
+
+
+# Bucket the selected routes by passenger volume and lay each bucket out as a single
+# NaN-separated polyline, so the map has `buckets` traces however many routes are shown
+def route_trace_batches(ranking, positions, buckets=5):
+    if len(positions) == 0:
+        return []
+
+    passengers = ranking.passengers[positions]
+    n_buckets = min(buckets, len(positions))
+    edges = np.quantile(passengers, np.linspace(0, 1, n_buckets + 1)[1:-1])
+    bucket_of = np.searchsorted(edges, passengers, side='right')
+
+    routes = ranking.routes
+    batches = []
+    for bucket in range(n_buckets):
+        in_bucket = bucket_of == bucket
+        members = positions[in_bucket]
+        if len(members) == 0:
+            continue
+        gap = np.full(len(members), np.nan, dtype=np.float32)
+        lat = np.column_stack([ranking.lat1[members], ranking.lat2[members], gap]).ravel()
+        lon = np.column_stack([ranking.lon1[members], ranking.lon2[members], gap]).ravel()
+
+        labels = (
+            "Route: " + routes['city1'].iloc[members].astype(str).to_numpy(dtype=object)
+            + " to " + routes['city2'].iloc[members].astype(str).to_numpy(dtype=object)
+            + "<br>Passengers: " + passengers[in_bucket].astype(str).astype(object)
+        )
+        text = np.column_stack([labels, labels, np.full(len(members), None, dtype=object)]).ravel()
+
+        batches.append({
+            'bucket': bucket,
+            'n_buckets': n_buckets,
+            'routes': len(members),
+            'min_passengers': int(passengers[in_bucket].min()),
+            'max_passengers': int(passengers[in_bucket].max()),
+            'lat': lat,
+            'lon': lon,
+            'text': text,
+        })
+    return batches
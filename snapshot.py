@@ -0,0 +1,393 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+import aggregates
+import routes
+
+# Local columnar snapshot of the airline dataset.
+#
+# `python snapshot.py` downloads the source CSV once and writes every column as a
+# .npy file (strings are dictionary encoded into integer codes + a categories file).
+# The app opens the columns with np.load(mmap_mode='r'), so starting a worker is a
+# handful of mmaps and never touches the network.
+#
+# Layout:
+#   snapshot/CURRENT                      -> name of the active version directory
+#   snapshot/<sha256[:16]>/manifest.json  -> source hash + column dtypes
+#   snapshot/<sha256[:16]>/<column>.npy   -> column data (or <column>.codes.npy / .categories.npy)
+#   snapshot/<sha256[:16]>/aggregates/<name>/  -> derived frames (cube, routes) in the same format
+#
+# `python snapshot.py --streaming` (or AIRLINE_INGEST_STREAMING=1) reads the source in
+# chunks instead and stores only the aggregates (cube, route table, carrier list), for
+# sources too large to hold in memory. Such a snapshot has no row columns.
+#
+# Because every worker maps the same files, the OS page cache holds one copy of the
+# data however many gunicorn workers attach to it (see gunicorn.conf.py).
+
+SOURCE_URL = os.environ.get(
+    'AIRLINE_SOURCE_URL',
+    'https://docs.google.com/spreadsheets/d/e/2PACX-1vSr2GZqDREbSXZ-U3GGH8ib-kC_ZKkUAuhtdSbRnuxJTcLsCl5gNvfli6SUyqHYnyF_3wa4qGLf6aeO/pub?output=csv'
+)
+SNAPSHOT_DIR = os.environ.get(
+    'AIRLINE_SNAPSHOT_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshot')
+)
+MANIFEST_NAME = 'manifest.json'
+CURRENT_NAME = 'CURRENT'
+AGGREGATES_NAME = 'aggregates'
+AGGREGATES_FORMAT = 1  # bump when the layout of a cached derived frame changes
+STREAMING_INGEST = os.environ.get('AIRLINE_INGEST_STREAMING', '0') == '1'
+INGEST_CHUNK_ROWS = int(os.environ.get('AIRLINE_INGEST_CHUNK_ROWS', 1_000_000))
+
+# The manifest records the source's size and a hash of its last TAIL_CHECK_BYTES, so
+# refresh.py can fetch only what was appended and still notice a rewritten source
+TAIL_CHECK_BYTES = 64 * 1024
+
+# Load-time schema: only the columns some view uses, each at the narrowest type that holds it.
+# Strings are dictionary encoded (categoricals); integer targets fall back to float32 when the
+# column has missing values.
+SCHEMA_VERSION = 1
+SCHEMA = {
+    'Year': 'int16',
+    'quarter': 'int8',
+    'carrier_full': 'category',
+    'city1': 'category',
+    'city2': 'category',
+    'Geocoded_City1': 'category',
+    'Geocoded_City2': 'category',
+    'fare': 'float32',
+    'passengers': 'int32',
+    'large_ms': 'float32',
+}
+
+
+# Helper function for reading the raw source (URL or local path)
+def read_source_bytes(source=SOURCE_URL):
+    if source.startswith(('http://', 'https://')):
+        with urllib.request.urlopen(source) as response:
+            return response.read()
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# Binary stream over the raw source, for reading it without holding it all in memory
+def open_source(source=SOURCE_URL):
+    if source.startswith(('http://', 'https://')):
+        return urllib.request.urlopen(source)
+    return open(source, 'rb')
+
+
+class _HashingReader(io.RawIOBase):
+    # Hashes everything read through it, so one pass both parses and fingerprints the source
+    def __init__(self, stream):
+        self.stream = stream
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.tail = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(len(buffer))
+        self.sha256.update(data)
+        self.size += len(data)
+        self.tail = (self.tail + data)[-TAIL_CHECK_BYTES:]
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def stream_hash(source=SOURCE_URL, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open_source(source) as stream:
+        for block in iter(lambda: stream.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Smallest signed integer type that can hold the dictionary codes (-1 marks missing values)
+def _codes_dtype(n_categories):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _apply_dtype(series, dtype):
+    if dtype == 'category':
+        return series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype('category')
+    if np.issubdtype(np.dtype(dtype), np.integer):
+        values = pd.to_numeric(series, errors='coerce')
+        if values.isna().any():
+            return values.astype('float32')
+        info = np.iinfo(dtype)
+        if values.min() < info.min or values.max() > info.max:
+            raise ValueError(f"Column {series.name} does not fit in {dtype}")
+        return values.astype(dtype)
+    return pd.to_numeric(series, errors='coerce').astype(dtype)
+
+
+# Keep only the schema columns and narrow their types
+def apply_schema(df, schema=SCHEMA):
+    return pd.DataFrame({name: _apply_dtype(df[name], dtype) for name, dtype in schema.items() if name in df.columns})
+
+
+# Bytes per column before and after apply_schema (dropped columns count as 0 after)
+def memory_report(before, after):
+    report = pd.DataFrame({
+        'before': before.memory_usage(index=False, deep=True),
+        'after': after.memory_usage(index=False, deep=True),
+    }).fillna(0).astype('int64')
+    report.loc['total'] = report.sum()
+    report['ratio'] = (report['after'] / report['before']).round(3)
+    return report
+
+
+def _write_column(version_dir, name, series):
+    if series.dtype == object or isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(series.dtype):
+        categorical = series.astype('category')
+        categories = np.asarray(categorical.cat.categories.astype(str), dtype=str)
+        codes = categorical.cat.codes.to_numpy().astype(_codes_dtype(len(categories)))
+        np.save(os.path.join(version_dir, f'{name}.codes.npy'), codes)
+        np.save(os.path.join(version_dir, f'{name}.categories.npy'), categories)
+        return {'kind': 'dictionary', 'dtype': str(codes.dtype)}
+
+    values = series.to_numpy()
+    np.save(os.path.join(version_dir, f'{name}.npy'), values)
+    return {'kind': 'plain', 'dtype': str(values.dtype)}
+
+
+# Write every column of df plus a manifest into a fresh directory
+def _write_frame(directory, df, metadata=None):
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    manifest = dict(metadata or {})
+    manifest['rows'] = int(len(df))
+    manifest['columns'] = {name: _write_column(directory, name, df[name]) for name in df.columns}
+    with open(os.path.join(directory, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# Memory-map a directory written by _write_frame back into a DataFrame. Plain columns and
+# dictionary codes stay backed by the mapped files; only the (small) category labels are read.
+def _read_frame(directory):
+    with open(os.path.join(directory, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+
+    columns = {}
+    for name, spec in manifest['columns'].items():
+        if spec['kind'] == 'dictionary':
+            codes = np.load(os.path.join(directory, f'{name}.codes.npy'), mmap_mode='r')
+            categories = np.load(os.path.join(directory, f'{name}.categories.npy'))
+            # Codes were written in the dtype pandas uses for this many categories (_codes_dtype),
+            # so nothing is cast; validate=False skips a pass over every code page
+            dtype = pd.CategoricalDtype(categories)
+            columns[name] = pd.Categorical.from_codes(codes, dtype=dtype, validate=False)
+        else:
+            columns[name] = np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+
+    return pd.DataFrame(columns, copy=False), manifest
+
+
+def current_version_dir(snapshot_dir=SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(snapshot_dir, CURRENT_NAME)) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    version_dir = os.path.join(snapshot_dir, name)
+    return version_dir if os.path.exists(os.path.join(version_dir, MANIFEST_NAME)) else None
+
+
+def read_manifest(snapshot_dir=SNAPSHOT_DIR):
+    version_dir = current_version_dir(snapshot_dir)
+    if version_dir is None:
+        return None
+    with open(os.path.join(version_dir, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+# A snapshot is stale when the source content no longer hashes to what was ingested
+def is_stale(source=SOURCE_URL, snapshot_dir=SNAPSHOT_DIR, data=None):
+    manifest = read_manifest(snapshot_dir)
+    if manifest is None:
+        return True
+    source_sha256 = content_hash(data) if data is not None else stream_hash(source)
+    return manifest['source_sha256'] != source_sha256
+
+
+# frames: optional {name: derived frame} published with the snapshot (see cached_frame)
+def write_snapshot(df, source_sha256, snapshot_dir=SNAPSHOT_DIR, source=SOURCE_URL, report=None, frames=None, extra=None):
+    version = source_sha256[:16]
+    version_dir = os.path.join(snapshot_dir, version)
+    tmp_dir = f'{version_dir}.{os.getpid()}.tmp'
+    manifest = _write_frame(tmp_dir, df, {
+        'version': version,
+        'source': source,
+        'source_sha256': source_sha256,
+        'schema_version': SCHEMA_VERSION,
+        'memory_report': report.to_dict(orient='index') if report is not None else None,
+        **(extra or {}),
+    })
+    for name, frame in (frames or {}).items():
+        _write_frame(os.path.join(tmp_dir, AGGREGATES_NAME, f'{name}.v{AGGREGATES_FORMAT}'), frame)
+
+    shutil.rmtree(version_dir, ignore_errors=True)
+    try:
+        os.replace(tmp_dir, version_dir)
+    except OSError:
+        # Another process published the same version (same source hash) first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    # Flip the CURRENT pointer atomically so readers never see a half-written snapshot
+    pointer_tmp = os.path.join(snapshot_dir, f'{CURRENT_NAME}.{os.getpid()}.tmp')
+    with open(pointer_tmp, 'w') as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(snapshot_dir, CURRENT_NAME))
+    return manifest
+
+
+# One-time ingest: download, hash, and convert the CSV unless the snapshot is already current
+def ingest(source=SOURCE_URL, snapshot_dir=SNAPSHOT_DIR, force=False, streaming=STREAMING_INGEST):
+    if streaming:
+        return ingest_streaming(source, snapshot_dir, force)
+    os.makedirs(snapshot_dir, exist_ok=True)
+    data = read_source_bytes(source)
+    source_sha256 = content_hash(data)
+
+    manifest = read_manifest(snapshot_dir)
+    if (not force and manifest is not None and manifest['source_sha256'] == source_sha256
+            and manifest.get('schema_version') == SCHEMA_VERSION):
+        return manifest, False
+
+    raw = pd.read_csv(io.BytesIO(data))
+    df = apply_schema(raw)
+    report = memory_report(raw, df)
+    return write_snapshot(df, source_sha256, snapshot_dir, source, report, extra={
+        'source_bytes': len(data), 'source_tail_sha256': content_hash(data[-TAIL_CHECK_BYTES:]),
+    }), True
+
+
+# Out-of-core ingest: one pass over the source in chunks of `chunk_rows`, folding each chunk
+# into the cube and the per-route totals and dropping it. Peak memory is one chunk plus the
+# aggregates (carriers x quarters, distinct routes), however many rows the source has.
+# max_routes keeps only the busiest routes (a partial selection, not a full sort).
+def ingest_streaming(source=SOURCE_URL, snapshot_dir=SNAPSHOT_DIR, force=False,
+                     chunk_rows=INGEST_CHUNK_ROWS, max_routes=None):
+    os.makedirs(snapshot_dir, exist_ok=True)
+    manifest = read_manifest(snapshot_dir)
+    if (not force and manifest is not None and manifest.get('schema_version') == SCHEMA_VERSION
+            and manifest['source_sha256'] == stream_hash(source)):
+        return manifest, False
+
+    cube = route_totals = None
+    carriers = {}
+    rows = 0
+    with open_source(source) as stream:
+        reader = _HashingReader(stream)
+        chunks = pd.read_csv(io.BufferedReader(reader), usecols=lambda name: name in SCHEMA, chunksize=chunk_rows)
+        for chunk in chunks:
+            chunk = apply_schema(chunk)
+            rows += len(chunk)
+            chunk_cube = aggregates.build_cube(chunk)
+            cube = chunk_cube if cube is None else aggregates.merge_cubes(cube, chunk_cube)
+            chunk_routes = routes.route_totals(chunk)
+            route_totals = chunk_routes if route_totals is None else routes.add_route_totals(route_totals, chunk_routes)
+            for carrier in pd.unique(chunk['carrier_full'].dropna()):
+                carriers.setdefault(str(carrier), None)
+    if cube is None:
+        raise ValueError(f"No rows in {source}")
+
+    city_index = routes.CityIndex.from_columns(route_totals['Geocoded_City1'], route_totals['Geocoded_City2'])
+    route_data = routes.join_coordinates(route_totals, city_index)
+    if max_routes:
+        route_data = route_data.nlargest(max_routes, 'passengers', keep='first').reset_index(drop=True)
+
+    manifest = write_snapshot(
+        pd.DataFrame(), reader.sha256.hexdigest(), snapshot_dir, source,
+        frames={'cube': cube, 'routes': route_data},
+        extra={'layout': 'aggregates', 'source_rows': rows, 'source_bytes': reader.size,
+               'source_tail_sha256': content_hash(reader.tail), 'carriers': list(carriers)},
+    )
+    return manifest, True
+
+
+# Open the current snapshot as a DataFrame backed by memory-mapped column files
+def load_snapshot(snapshot_dir=SNAPSHOT_DIR):
+    version_dir = current_version_dir(snapshot_dir)
+    if version_dir is None:
+        raise FileNotFoundError(f"No dataset snapshot in {snapshot_dir}; run `python snapshot.py` first.")
+    df, manifest = _read_frame(version_dir)
+    if manifest.get('schema_version') != SCHEMA_VERSION:
+        # Snapshot predates the current schema; narrow it in memory until it is re-ingested
+        df = apply_schema(df)
+    return df, manifest
+
+
+# Derived frames (aggregates) are persisted next to the snapshot version they came from, so
+# only the first process to need one builds it; every other worker maps the saved columns
+def cached_frame(name, version, build, snapshot_dir=SNAPSHOT_DIR):
+    frame_dir = os.path.join(snapshot_dir, version, AGGREGATES_NAME, f'{name}.v{AGGREGATES_FORMAT}')
+    if os.path.exists(os.path.join(frame_dir, MANIFEST_NAME)):
+        return _read_frame(frame_dir)[0]
+
+    df = build()
+    tmp_dir = f'{frame_dir}.{os.getpid()}.tmp'
+    _write_frame(tmp_dir, df)
+    try:
+        os.replace(tmp_dir, frame_dir)
+    except OSError:
+        # Another worker published the same frame first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return _read_frame(frame_dir)[0]
+
+
+# Used by the app: open the snapshot, ingesting once if none exists yet
+def open_dataset(source=SOURCE_URL, snapshot_dir=SNAPSHOT_DIR):
+    if current_version_dir(snapshot_dir) is None:
+        ingest(source, snapshot_dir)
+    return load_snapshot(snapshot_dir)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the local columnar snapshot of the airline dataset.")
+    parser.add_argument('--source', default=SOURCE_URL, help="CSV URL or local path")
+    parser.add_argument('--snapshot-dir', default=SNAPSHOT_DIR)
+    parser.add_argument('--force', action='store_true', help="Rebuild even if the source hash is unchanged")
+    parser.add_argument('--check', action='store_true', help="Only report whether the snapshot is stale (exit 1 if so)")
+    parser.add_argument('--report', action='store_true', help="Print bytes per column before and after the schema")
+    parser.add_argument('--streaming', action='store_true', default=STREAMING_INGEST,
+                        help="Read the source in chunks and store only the aggregates (for sources larger than memory)")
+    parser.add_argument('--chunk-rows', type=int, default=INGEST_CHUNK_ROWS, help="Rows per chunk with --streaming")
+    parser.add_argument('--max-routes', type=int, default=None, help="Keep only the N busiest routes with --streaming")
+    args = parser.parse_args()
+
+    if args.check:
+        stale = is_stale(args.source, args.snapshot_dir)
+        print("Snapshot is stale." if stale else "Snapshot is up to date.")
+        sys.exit(1 if stale else 0)
+
+    if args.streaming:
+        manifest, written = ingest_streaming(args.source, args.snapshot_dir, args.force, args.chunk_rows, args.max_routes)
+    else:
+        manifest, written = ingest(args.source, args.snapshot_dir, force=args.force)
+    status = "Wrote" if written else "Up to date:"
+    rows = manifest.get('source_rows', manifest['rows'])
+    print(f"{status} snapshot {manifest['version']} ({rows} rows) in {args.snapshot_dir}")
+    if args.report and manifest.get('memory_report'):
+        print(pd.DataFrame.from_dict(manifest['memory_report'], orient='index').to_string())
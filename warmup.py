@@ -0,0 +1,108 @@
+import logging
+import os
+import threading
+import time
+
+import flask
+
+import dataset
+
+# Startup preparation, off the import path.
+#
+# Importing the app no longer touches the data (see dataset.py), so the server can take
+# requests as soon as the layout code is loaded. start() then opens the snapshot, runs
+# the app's own preparation (pinning exported views, importing plotly.express) and builds
+# every Dataset view on a small thread pool. A request that arrives first simply builds
+# what it needs itself.
+#
+# /ready answers 200 once the dataset is open and every view is built, and 503 until then,
+# for load balancers and orchestrators; /ready?verbose=1 lists the views still pending.
+# Readiness is read from the current dataset, so a worker becomes ready however its views
+# got built; if the warm-up failed, the next probe starts it again.
+#
+# AIRLINE_WARMUP=0 skips the thread entirely: everything is built on first use, and
+# /ready answers 200 as soon as the app is imported.
+# AIRLINE_WARMUP_WORKERS sets the pool size. Failures are logged to the `warmup` logger.
+
+ENABLED = os.environ.get('AIRLINE_WARMUP', '1') == '1'
+WORKERS = int(os.environ.get('AIRLINE_WARMUP_WORKERS', 4))
+
+logger = logging.getLogger(__name__)
+
+_done = threading.Event()
+_lock = threading.Lock()
+_state = {'started': None, 'finished': None, 'error': None, 'prepare': None, 'workers': WORKERS}
+
+
+def _run():
+    try:
+        ds = dataset.current()
+        if _state['prepare'] is not None:
+            _state['prepare'](ds)
+        ds.derive_all(_state['workers'])
+    except Exception as error:  # keep serving; the next /ready probe retries
+        _state['error'] = repr(error)
+        logger.exception("Warm-up failed")
+    finally:
+        _state['finished'] = time.time()
+        _done.set()
+
+
+def _launch():
+    _state['started'], _state['finished'], _state['error'] = time.time(), None, None
+    _done.clear()
+    thread = threading.Thread(target=_run, name='airline-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+# Start the warm-up thread; prepare(ds) runs once the dataset is open
+def start(prepare=None, workers=WORKERS):
+    _state['prepare'], _state['workers'] = prepare, workers
+    if not ENABLED:
+        _state['started'] = _state['finished'] = time.time()
+        _done.set()
+        return None
+    with _lock:
+        return _launch()
+
+
+# Start the warm-up again if the last one failed (and none is running)
+def _retry():
+    with _lock:
+        if _done.is_set() and _state['error'] is not None:
+            _launch()
+
+
+# Block until the warm-up has finished (or `timeout` seconds); returns whether it has
+def wait(timeout=None):
+    return _done.wait(timeout)
+
+
+def status():
+    ds = dataset.loaded()
+    pending = ds.pending() if ds is not None else ['dataset']
+    result = {
+        'ready': not ENABLED or not pending,
+        'dataset_version': ds.version if ds is not None else None,
+        'pending': pending,
+        'error': _state['error'],
+    }
+    if _state['started'] is not None:
+        end = _state['finished'] or time.time()
+        result['warmup_seconds'] = round(end - _state['started'], 3)
+    return result
+
+
+def install(server):
+    @server.route('/ready')
+    def serve_ready():
+        if ENABLED:
+            _retry()
+        result = status()
+        if not flask.request.args.get('verbose'):
+            result = {'ready': result['ready'], 'dataset_version': result['dataset_version']}
+        response = flask.jsonify(result)
+        response.status_code = 200 if result['ready'] else 503
+        response.cache_control.no_store = True
+        return response